@@ -5,12 +5,40 @@
 #               Implemented a team array to store all of the players for each team, instead of one single player.
 #               Updated the game logic for one player to move per turn and check the movement against all players.
 
-from collections import deque
+from collections import Counter, deque, namedtuple
+import copy
 import random
 import time
-import networkx as nx
-import matplotlib.pyplot as plt
-plt.ion()
+import board
+from distances import make_distances
+import profiling
+
+# Summary of a finished game, returned by run_game
+GameResult = namedtuple("GameResult", ["winner", "turns", "captures", "resets", "repetitions", "draw_reason"])
+
+# The weights used when scoring moves in GameState.player_scores
+ScoringWeights = namedtuple("ScoringWeights", ["cluster_penalty", "threat_penalty", "carrier_penalty", "proximity"])
+DEFAULT_WEIGHTS = ScoringWeights(cluster_penalty=0.8, threat_penalty=0.7, carrier_penalty=0.5, proximity=1.0)
+
+# A game is drawn when the same position comes up this many times, as the heuristics can chase each other forever
+REPETITION_LIMIT = 3
+# The turn limit used by CaptureTheFlag.play, after which the game is drawn
+MAX_TURNS = 1000
+
+MASK = 0xFFFFFFFFFFFFFFFF
+FLAG_KEY = 2       # Players are keyed by their team (0 or 1), carried flags by this
+BLUE_TO_MOVE = 0x5BD1E9955BD1E995
+
+def zobrist_key(*parts):
+    """Return a random looking 64 bit key for a piece of a position (e.g. a team and a node), by mixing its parts with
+    splitmix64, so the keys don't need a table the size of the board"""
+    key = 0
+    for part in parts:
+        key = (key + part + 0x9E3779B97F4A7C15) & MASK
+        key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & MASK
+        key ^= key >> 31
+    return key
 
 class Flag:
     def __init__(self, team, base_node):
@@ -43,17 +71,21 @@ class Player:
         self.base_node = base_node
         self.has_enemy_flag = False
 
-    def move(self, graph, state):
-        """Move player"""
-        path = self.balanced_move(graph, state, self)
+    def move(self, graph, state, path=None):
+        """Move player, along a path already chosen by the heuristics if one is given"""
+        if path is None:
+            path = self.balanced_move(graph, state, self)
+        start = self.position
         if len(path)>1:
             self.position = path[1]
         else:
-            self.position = self.random_move(graph) # If no optimal move was caluclated
+            profiling.count("random_move_fallback")
+            self.position = self.random_move(graph, state.rng) # If no optimal move was caluclated
+        state.update_occupancy(self, start)
 
-    def random_move(self, graph):
+    def random_move(self, graph, rng=random):
         """Pick a random available move"""
-        return random.choice(list(graph.neighbors(self.position)))
+        return rng.choice(list(graph.neighbors(self.position)))
         
     def get_opposition_players(self, state):
         """Return the team who's turn it is not"""
@@ -80,6 +112,7 @@ class Player:
         """Decide whether the player is in a safe zone (either base node)"""
         return self.position == state.red_base or self.position == state.blue_base
         
+    @profiling.timed("shortest_path_move")
     def shortest_path_move(self, graph, state, current_player):
         """Return the next node in the shortest path to the player's target (flag/base)"""
         enemy_flag = self.get_enemy_flag(state)
@@ -99,18 +132,17 @@ class Player:
                 target = state.blue_flag.position   # ...move towards the enemy's flag
             else:
                 target = state.red_flag.position    # ...move towards the enemy's flag
-        # Return the shortest path to the target
-        path = nx.shortest_path(graph, current_player.position, target)
+        # Return the start of the shortest path to the target (only its first step is ever taken)
+        path = state.distances.first_step(current_player.position, target)
         return path
 
-    def defensive_move(self, graph, state, current_player):
+    @profiling.timed("defensive_move")
+    def defensive_move(self, graph, state, current_player, context=None):
         """Return the next move in an attempt to block the opponent if they have a flag, otherwise move to capture the flag"""
-        opposition_players = self.get_opposition_players(state)
-        flag_carrier = None
-        # Find the player (if any) that is carrying the flag
-        for opposition_player in opposition_players:
-            if opposition_player.has_enemy_flag:
-                flag_carrier = opposition_player
+        if context is None:
+            context = TurnContext(state, current_player.team)
+        # The player (if any) that is carrying the flag
+        flag_carrier = context.flag_carrier
 
         # First check if an opposition player has your flag
         if flag_carrier != None:
@@ -120,20 +152,22 @@ class Player:
             # If the opponent is not in range...
             else:
                 # ...then block the opponents path to return the flag
-                opposition_path = nx.shortest_path(graph, flag_carrier.position, flag_carrier.base_node)
-                target = opposition_path[int(len(opposition_path)/2)]   # Aim for the center of the opponent's path back 
-                path = nx.shortest_path(graph, current_player.position, target)
+                target = context.block_target()   # Aim for the center of the opponent's path back
+                path = state.distances.first_step(current_player.position, target)
                 # If player is already in the center of the path, move closer to the opponent
                 if target == current_player.position:
-                    path = nx.shortest_path(graph, current_player.position, flag_carrier.position)
+                    path = state.distances.first_step(current_player.position, flag_carrier.position)
                 return path
         # If the opponent isn't carrying the team's flag, aim to capture their flag.
         else:
             return self.shortest_path_move(graph, state, current_player)
         
-    def balanced_move(self, graph, state, current_player):
-        """Consider game situation to decide whether to attack or defend"""
-        opposition_players = self.get_opposition_players(state)
+    @profiling.timed("balanced_move")
+    def balanced_move(self, graph, state, current_player, context=None):
+        """Consider game situation to decide whether to attack or defend.
+        The context holds the parts that are the same for the whole team, so they can be shared between players."""
+        if context is None:
+            context = TurnContext(state, current_player.team)
         current_flag = self.get_current_flag(state)
         enemy_flag = self.get_enemy_flag(state)
 
@@ -145,32 +179,83 @@ class Player:
         else:
             player_target = enemy_flag.position
         
-        # Find which of the players is closest to their target
-        min_opposition_distance = float('inf')
-        for opposition_player in opposition_players:
-            # Find the target for the opponent depending on whether they have a flag
-            if opposition_player.has_enemy_flag == True:
-                opposition_target = opposition_player.base_node
-            else:
-                opposition_target = current_flag.position
-
-            # Calculate the distance from the target and decide if it is the closest on the team
-            opposition_distance = len(nx.shortest_path(graph, opposition_player.position, opposition_target))
-            if opposition_distance < min_opposition_distance:
-                min_opposition_distance = opposition_distance
-
         # Calcuate the distance from the current player to their target
-        player_distance = len(nx.shortest_path(graph, current_player.position, player_target))
+        player_distance = state.distances.path_length(current_player.position, player_target)
         # If the player is closer to its target than the opponents...
-        if player_distance <= min_opposition_distance:
+        if player_distance <= context.min_opposition_distance:
             return self.shortest_path_move(graph, state, current_player)    # ...attack
         # If the opponent is closer to its target than the player...
         else:
-            return self.defensive_move(graph, state, current_player) # ...defend
-        
+            return self.defensive_move(graph, state, current_player, context) # ...defend
+
+class TurnContext:
+    """The parts of the heuristics that are the same for every player on a team, worked out once per turn
+    rather than once for each player"""
+    def __init__(self, state, team):
+        self.state = state
+        if team == "red":
+            self.players = state.red
+            self.enemy_players = state.blue
+            self.current_flag = state.red_flag
+            self.enemy_flag = state.blue_flag
+            self.enemy_base = state.blue_base
+        else:
+            self.players = state.blue
+            self.enemy_players = state.red
+            self.current_flag = state.blue_flag
+            self.enemy_flag = state.red_flag
+            self.enemy_base = state.red_base
+
+        # Find the opponent (if any) that is carrying the team's flag
+        self.flag_carrier = None
+        for enemy in self.enemy_players:
+            if enemy.has_enemy_flag:
+                self.flag_carrier = enemy
+        self.block = None
+
+        # Find how close the closest opponent is to their target: the flag carrier is heading home, and the rest are
+        # heading for the team's flag, so they are asked about together (letting the distances skip hopeless ones)
+        self.min_opposition_distance = float('inf')
+        if self.flag_carrier is not None:
+            self.min_opposition_distance = state.distances.path_length(self.flag_carrier.position, self.flag_carrier.base_node)
+        attackers = [enemy.position for enemy in self.enemy_players if not enemy.has_enemy_flag]
+        if attackers:
+            enemy_distance = state.distances.min_distance(attackers, self.current_flag.position) + 1
+            if enemy_distance < self.min_opposition_distance:
+                self.min_opposition_distance = enemy_distance
+
+        # How many of each team are on each node, to spot moves that cluster with team mates or go near opponents
+        self.team_counts = state.occupancy[team]
+        self.enemy_counts = state.occupancy["blue" if team == "red" else "red"]
+
+        # How urgent it is to get the team's flag back, if it's stolen
+        self.base_proximity = None
+        if self.current_flag.carried_by is not None:
+            total_distance = state.distances.path_length(self.current_flag.base_node, self.enemy_base)
+            opp_distance_home = state.distances.path_length(self.current_flag.position, self.enemy_base)
+            self.base_proximity = total_distance/opp_distance_home
+
+    def is_threatened(self, node):
+        """Check if a node is within striking distance of an opponent (on it or next to it)"""
+        if self.enemy_counts[node] > 0:
+            return True
+        for neighbour in self.state.graph.neighbors(node):
+            if self.enemy_counts[neighbour] > 0:
+                return True
+        return False
+
+    def block_target(self):
+        """Return the centre of the flag carrier's path home, where defenders try to block them"""
+        if self.block is None:
+            opposition_path = self.state.distances.path(self.flag_carrier.position, self.flag_carrier.base_node)
+            self.block = opposition_path[int(len(opposition_path)/2)]
+        return self.block
+
 class GameState:
-    def __init__(self, graph, red_players, blue_players, red_flag, blue_flag, red_base, blue_base):
+    def __init__(self, graph, red_players, blue_players, red_flag, blue_flag, red_base, blue_base, distances=None):
         self.graph = graph
+        # Precompute the shortest paths once, rather than searching the graph on every move (or cache them per target on big graphs)
+        self.distances = distances if distances is not None else make_distances(graph)
         self.red = red_players
         self.blue = blue_players
         self.red_flag = red_flag
@@ -180,6 +265,69 @@ class GameState:
         self.turn = "red"
         self.winner = None
         self.turn_count = 0
+        self.captures = 0   # Number of times a flag has been picked up from its base
+        self.resets = 0     # Number of times a carried flag has been intercepted and reset
+        self.rng = random   # Source of randomness for the fallback moves, can be replaced by a seeded random.Random
+        self.last_move = None   # (from, to) nodes of the last move
+        # The weights each team scores its moves with, which can be changed to try out (or tune) other weights
+        self.weights = {"red": DEFAULT_WEIGHTS, "blue": DEFAULT_WEIGHTS}
+        # How many players of each team are on each node, kept up to date as players move
+        self.occupancy = {"red": Counter(player.position for player in red_players),
+                          "blue": Counter(player.position for player in blue_players)}
+        # A rolling hash of where the players are, with a key added for each player so that team mates on the same
+        # node don't cancel out, updated as players move rather than recomputed every turn
+        self.players_hash = 0
+        for team, players in ((0, red_players), (1, blue_players)):
+            for player in players:
+                self.players_hash = (self.players_hash + zobrist_key(team, player.position)) & MASK
+        # Draws: the number of times each position has come up, and the turn limit (if any)
+        self.repetition_limit = REPETITION_LIMIT
+        self.max_turns = None
+        self.seen = Counter([self.position_hash()])
+        self.repetitions = 0    # Number of turns that ended in a position that had already come up
+        self.draw_reason = None
+
+    def copy(self):
+        """Return a copy of the state that can be searched or played on without changing this one (e.g. by an agent
+        in another thread). The graph and distances are shared, as they never change, and the copy's random stream
+        starts from where this one is."""
+        clone = copy.copy(self)
+        clone.red = [copy.copy(player) for player in self.red]
+        clone.blue = [copy.copy(player) for player in self.blue]
+        players = self.red + self.blue
+        clone_players = clone.red + clone.blue
+        clone.red_flag = copy.copy(self.red_flag)
+        clone.blue_flag = copy.copy(self.blue_flag)
+        for flag in (clone.red_flag, clone.blue_flag):
+            if flag.carried_by is not None:
+                flag.carried_by = clone_players[players.index(flag.carried_by)]
+        clone.occupancy = {team: Counter(counts) for team, counts in self.occupancy.items()}
+        clone.seen = Counter(self.seen)
+        clone.weights = dict(self.weights)
+        clone.rng = random.Random()
+        clone.rng.setstate(self.rng.getstate())
+        return clone
+
+    def position_hash(self):
+        """Return the hash of the position: the players, the flag carriers and whose turn it is"""
+        key = self.players_hash
+        # A flag is either at its base or with its carrier, so the carrier's node is enough to tell where it is
+        for team, flag in ((0, self.red_flag), (1, self.blue_flag)):
+            if flag.carried_by is not None:
+                key += zobrist_key(FLAG_KEY, team, flag.carried_by.position)
+        if self.turn == "blue":
+            key ^= BLUE_TO_MOVE
+        return key & MASK
+
+    def update_occupancy(self, player, start):
+        """Move a player from the start node to its new position in the occupancy index"""
+        counts = self.occupancy[player.team]
+        counts[start] -= 1
+        if counts[start] == 0:
+            del counts[start]   # Keep the index to the nodes that are actually occupied
+        counts[player.position] += 1
+        team = 0 if player.team == "red" else 1
+        self.players_hash = (self.players_hash - zobrist_key(team, start) + zobrist_key(team, player.position)) & MASK
 
     def switch_turn(self):
         """Change the player at the end of a turn"""
@@ -188,32 +336,37 @@ class GameState:
         else:
             self.turn = "red"
 
+    @profiling.timed("check_movement")
     def check_movement(self, player):
         """Ensure the correct rules are applied based on player movements"""
         if self.turn == "red":
             returning_flag = self.red_flag
-            # Check all opponents to see if they're carrying flag and a player has intercepted
-            for blue_player in self.blue:
-                if player.position == blue_player.position:
-                    # If a player has intercepted and opponent is not in a safe zone, then reset flag
-                    if returning_flag.carried_by == blue_player and blue_player.is_safe(self) == False:
-                        returning_flag.reset()
-                        blue_player.has_enemy_flag = False
+            # Only the opponent carrying the flag can be intercepted, so check whether the player landed on them
+            blue_player = returning_flag.carried_by
+            if blue_player is not None and player.position == blue_player.position:
+                # If a player has intercepted and opponent is not in a safe zone, then reset flag
+                if blue_player.is_safe(self) == False:
+                    returning_flag.reset()
+                    blue_player.has_enemy_flag = False
+                    self.resets += 1
             # Pick up the flag from its base
             if player.position == self.blue_flag.position and self.blue_flag.carried_by is None:
-                self.blue_flag.pick_up(player)    
+                self.blue_flag.pick_up(player)
+                self.captures += 1
         else:
             returning_flag = self.blue_flag
-            # Check all opponents to see if they're carrying flag and a player has intercepted
-            for red_player in self.red:
-                if player.position == red_player.position:
-                    # If a player has intercepted and opponent is not in a safe zone, then reset flag
-                    if returning_flag.carried_by == red_player and red_player.is_safe(self) == False:
-                        returning_flag.reset()
-                        red_player.has_enemy_flag = False
+            # Only the opponent carrying the flag can be intercepted, so check whether the player landed on them
+            red_player = returning_flag.carried_by
+            if red_player is not None and player.position == red_player.position:
+                # If a player has intercepted and opponent is not in a safe zone, then reset flag
+                if red_player.is_safe(self) == False:
+                    returning_flag.reset()
+                    red_player.has_enemy_flag = False
+                    self.resets += 1
             # Pick up the flag from its base
             if player.position == self.red_flag.position and self.red_flag.carried_by is None:
                 self.red_flag.pick_up(player)
+                self.captures += 1
 
         # Update flag position to follow its carrier
         if self.red_flag.carried_by is not None:
@@ -221,136 +374,180 @@ class GameState:
         if self.blue_flag.carried_by is not None:
             self.blue_flag.position = self.blue_flag.carried_by.position
 
-    def player_to_move(self):
-        """Select the player whose move is the most benificial."""
-        if self.turn == "red":
-            players = self.red
-            enemy_players = self.blue
-            current_flag = self.red_flag
-            enemy_flag = self.blue_flag
-            enemy_base = self.blue_base
-        else:
-            players = self.blue
-            enemy_players = self.red
-            current_flag = self.blue_flag
-            enemy_flag = self.red_flag
-            enemy_base = self.red_base
+    def player_scores(self):
+        """Score how beneficial each player's next move would be, returning a list of (score, player, path)"""
+        # Work out everything shared by the team once, then score every player's move in a single pass
+        context = TurnContext(self, self.turn)
+        enemy_flag = context.enemy_flag
+        current_flag = context.current_flag
+        weights = self.weights[self.turn]
 
-        best_player = None
-        best_score = float("-inf")
+        scores = []
 
         # For each player, calculate how beneficial a move is
-        for player in players:
-            path = player.balanced_move(self.graph, self, player)
+        for player in context.players:
+            path = player.balanced_move(self.graph, self, player, context)
             if len(path) <= 1:
                 continue
+            next_node = path[1]
 
             score = 0
 
             # Record how much closer the move brings the player to its target
             target = player.base_node if player.has_enemy_flag else enemy_flag.position
-            old_distance = len(nx.shortest_path(self.graph, player.position, target))
-            new_distance = len(nx.shortest_path(self.graph, path[1], target))
-            score += (old_distance - new_distance) + 1 / (1 + new_distance)
+            old_distance = self.distances.path_length(player.position, target)
+            new_distance = self.distances.path_length(next_node, target)
+            score += (old_distance - new_distance) + weights.proximity / (1 + new_distance)
 
             # Penalise moves if they cluster with team mates
-            team_positions = []
-            for p in players:
-                if p != player:
-                    team_positions.append(p.position)
-            if path[1] in team_positions:
-                score = 0.8*score
+            if context.team_counts[next_node] - (player.position == next_node) > 0:
+                score = weights.cluster_penalty*score
 
             # Reward moves if they reduce distance to team's flag, if it's stolen
-            current_flag = self.red_flag if self.turn == "red" else self.blue_flag
-            if current_flag.carried_by is not None:
-                distance_to_flag = len(nx.shortest_path(self.graph, path[1], current_flag.position))
-                total_distance = len(nx.shortest_path(self.graph, current_flag.base_node, enemy_base))
-                opp_distance_home = len(nx.shortest_path(self.graph, current_flag.position, enemy_base))
-                base_proximity = total_distance/opp_distance_home
-
-                score += base_proximity / (1 + distance_to_flag)  # closer to flag = higher score
+            if context.base_proximity is not None:
+                distance_to_flag = self.distances.path_length(next_node, current_flag.position)
+                score += context.base_proximity / (1 + distance_to_flag)  # closer to flag = higher score
 
             # Penalise moves that enter the striking distance of opponents
-            threat_nodes = set()
-            for enemy in enemy_players:
-                threat_nodes.add(enemy.position)
-                threat_nodes.update(self.graph.neighbors(enemy.position))
-
-            if path[1] in threat_nodes:
-                score = score*0.7  # Penalty for moving within striking distance
+            threatened = context.is_threatened(next_node)
+            if threatened:
+                score = score*weights.threat_penalty  # Penalty for moving within striking distance
 
             # Stronger penalty if carrying enemy flag 
-            if player.has_enemy_flag and path[1] in threat_nodes:
-                score = score*0.5
+            if player.has_enemy_flag and threatened:
+                score = score*weights.carrier_penalty
+
+            scores.append((score, player, path))
+
+        return scores
 
-            # Keep the best-scoring player
+    @profiling.timed("player_to_move")
+    def select_move(self):
+        """Select the player whose move is the most benificial, returning (player, path).
+        The path is None if no player has a move, in which case a random player makes a random move."""
+        best_player = None
+        best_path = None
+        best_score = float("-inf")
+
+        # Keep the best-scoring player
+        for score, player, path in self.player_scores():
             if score > best_score:
                 best_score = score
                 best_player = player
+                best_path = path
 
         # If there is a best option, return it
         if best_player:
-            return best_player
+            return best_player, best_path
         # Return a random player if no best option was found
         else:
-            return random.choice(players)
-              
+            profiling.count("random_player_fallback")
+            return self.rng.choice(self.red if self.turn == "red" else self.blue), None
+
+    def player_to_move(self):
+        """Select the player whose move is the most benificial."""
+        return self.select_move()[0]
 
+
+    @profiling.timed("check_win")
     def check_win(self):
         """Check if either player has captured their opponents flag"""
         if self.red_flag.is_captured():
             self.winner = "Blue"
         elif self.blue_flag.is_captured():
             self.winner = "Red"
+
+    def check_draw(self):
+        """Draw the game if the position has come up too many times, or the turn limit has been reached"""
+        key = self.position_hash()
+        self.seen[key] += 1
+        if self.seen[key] > 1:
+            self.repetitions += 1
+        if self.repetition_limit is not None and self.seen[key] >= self.repetition_limit:
+            self.winner = "Draw"
+            self.draw_reason = "repetition"
+        elif self.max_turns is not None and self.turn_count >= self.max_turns:
+            self.winner = "Draw"
+            self.draw_reason = "turn limit"
+
+    def end_turn(self, player):
+        """Process the result of a player's move and pass the turn to the other team"""
+        self.check_movement(player)
+        self.check_win()
+        self.switch_turn()
+        self.turn_count += 1
+        if self.winner is None:
+            self.check_draw()
+        if profiling.metrics is not None:
+            profiling.metrics.end_turn()
+
+    def move_player(self, player, node):
+        """Make a move chosen outside of the heuristics, e.g. by a search agent"""
+        self.last_move = (player.position, node)
+        start = player.position
+        player.position = node
+        self.update_occupancy(player, start)
+        self.end_turn(player)
+
+    @profiling.timed("turn")
+    def play_turn(self):
+        """Find a player to move, move them and process the result of the move"""
+        player, path = self.select_move()
+        start = player.position
+        player.move(self.graph, self, path)   # Reuse the path found while scoring, rather than working it out again
+        self.last_move = (start, player.position)
+        self.end_turn(player)
+        return player
         
 class CaptureTheFlag:
-    def __init__(self, graph, red_player, blue_player, red_flag, blue_flag, red_base, blue_base):
-        self.state = GameState(graph, red_player, blue_player, red_flag, blue_flag, red_base, blue_base)
-        self.pos = nx.spring_layout(graph, seed=42)
+    def __init__(self, graph, red_player, blue_player, red_flag, blue_flag, red_base, blue_base, distances=None):
+        self.state = GameState(graph, red_player, blue_player, red_flag, blue_flag, red_base, blue_base, distances)
+        self.renderer = None   # The renderer is only created once the game is drawn
 
     def draw_graph(self):
         """Show the game state on the graph - for testing"""
-        plt.clf() # Clear the existing graph
-        nx.draw(self.state.graph, self.pos, with_labels=True) # Draw the updated graph
-        # Colour the nodes to show the flag and player positions
-        nx.draw_networkx_nodes(self.state.graph, self.pos, nodelist=[self.state.red_flag.position], edgecolors="red", linewidths=4)
-        nx.draw_networkx_nodes(self.state.graph, self.pos, nodelist=[self.state.blue_flag.position], edgecolors="blue", linewidths=4)
-        nx.draw_networkx_nodes(self.state.graph, self.pos, nodelist=[player.position for player in self.state.red], node_color="pink")
-        nx.draw_networkx_nodes(self.state.graph, self.pos, nodelist=[player.position for player in self.state.blue], node_color="cyan")
-        # Show the updated graph
-        plt.show()
-        plt.pause(0.2)
-
-    def play(self):
-        """Allow the players to move until there is a winner"""
-        while self.state.winner is None:
+        # The display module (and matplotlib) are only imported when a game is actually drawn
+        import display
+        if self.renderer is None:
+            self.renderer = display.GameRenderer(self.state.graph)
+        self.renderer.update(display.snapshot(self.state))
+        self.renderer.show()
+
+    def play(self, delay=0.2, record=None, max_turns=MAX_TURNS):
+        """Allow the players to move until there is a winner, or the game is drawn.
+        If record is a directory or a .gif/.mp4 file, the game is recorded there in the background instead of being shown.
+        The game is drawn after max_turns turns (None for no limit), or when a position repeats too often."""
+        self.state.max_turns = max_turns
+        recorder = None
+        if record is not None:
+            import display
+            recorder = display.RenderWorker(self.state.graph, record)
+            recorder.start()
+
+        while True:
             # Update game state display
-            self.draw_graph()
-            # Find a player to move, and move them
-            player = self.state.player_to_move()          
-            player.move(self.state.graph, self.state)
-            # Process the move
-            self.state.check_movement(player)
-            self.state.check_win()
-            self.state.switch_turn()
-            time.sleep(0.2)
+            if recorder is not None:
+                recorder.submit(display.snapshot(self.state))
+            else:
+                self.draw_graph()
+                time.sleep(delay)
+            if self.state.winner is not None:
+                break
+            # Find a player to move, move them and process the move
+            self.state.play_turn()
+
+        if recorder is not None:
+            recorder.close()
         # Display the winner at the end of the game
-        print("WINNER: ", self.state.winner)    
+        if self.state.draw_reason is not None:
+            print("WINNER: ", self.state.winner, f"({self.state.draw_reason})")
+        else:
+            print("WINNER: ", self.state.winner)
 
 def build_graph():
-    """Create the playing graph and label its nodes"""
-    # Set the graph topology
-    graph = nx.grid_2d_graph(4, 3) 
-
-    # Give each node a numbered label
-    labels = {}
-    nodes = list(graph.nodes())
-    for i in range(len(nodes)):
-        labels[nodes[i]] = i
-    graph = nx.relabel_nodes(graph, labels)
-    
-    return graph    
+    """Create the playing graph, with its nodes numbered in the same order as nx.grid_2d_graph"""
+    # Build the grid straight into a compact board, rather than building and then relabelling a networkx graph
+    return board.grid(4, 3)
 
 def positions(graph, base, num_players):
     """Use a BFS to surround the team's base node with the specified number of players"""
@@ -372,6 +569,82 @@ def positions(graph, base, num_players):
 
     return order
 
+def new_game(graph, teams, red_base=None, blue_base=None, distances=None, seed=None, starts=None):
+    """Set up a GameState with teams players on each side, standing around their bases (or on the nodes given by starts,
+    as (red positions, blue positions)). The bases default to the first and last nodes, as in main().
+    The game gets its own random stream from seed, rather than sharing the global random module."""
+    nodes = list(graph.nodes())
+    if red_base is None:
+        red_base = nodes[0]
+    if blue_base is None:
+        blue_base = nodes[-1]
+    if starts is None:
+        starts = positions(graph, red_base, teams), positions(graph, blue_base, teams)
+    # Set up the players and flags around each base
+    red_players = [Player("red", start_node=position, base_node=red_base) for position in starts[0]]
+    blue_players = [Player("blue", start_node=position, base_node=blue_base) for position in starts[1]]
+    red_flag = Flag("red", base_node=red_base)
+    blue_flag = Flag("blue", base_node=blue_base)
+    state = GameState(graph, red_players, blue_players, red_flag, blue_flag, red_base, blue_base, distances)
+    state.rng = random.Random(seed)
+    return state
+
+def heuristic_policy(state):
+    """Move the way the built-in heuristics would, returning (player, node)"""
+    player, path = state.select_move()
+    if path is None:
+        return player, player.random_move(state.graph, state.rng)
+    return player, path[1]
+
+def random_policy(state, rng=None):
+    """Move a random player on the team to a random neighbour, returning (player, node). rng defaults to the game's."""
+    rng = state.rng if rng is None else rng
+    player = rng.choice(state.red if state.turn == "red" else state.blue)
+    return player, player.random_move(state.graph, rng)
+
+def exploring_move(state, rng, opening_moves, epsilon):
+    """Return a random (player, node) move from rng if this turn explores: every one of the first opening_moves turns,
+    and after that with probability epsilon. Returns None for the other turns."""
+    if state.turn_count < opening_moves or (epsilon > 0 and rng.random() < epsilon):
+        return random_policy(state, rng)
+    return None
+
+def run_game(graph, teams, seed=None, max_turns=None, red_base=None, blue_base=None, distances=None, observer=None, weights=None,
+             repetition_limit=REPETITION_LIMIT, opening_moves=0, epsilon=0.0):
+    """Play a game without drawing it and return a summary of the result.
+    teams is the number of players on each team, and the bases default to the first and last nodes, as in main().
+    The winner is "Draw" if max_turns is reached before a flag is captured, or a position comes up repetition_limit
+    times (None to play on through repeated positions).
+    Pass in prebuilt distances to share them between many games on the same graph.
+    An observer (e.g. a game recorder) has its start(state), turn(state, player) and finish(state) methods called as the game is played.
+    weights can map "red" and/or "blue" to the ScoringWeights that team uses in place of DEFAULT_WEIGHTS.
+    The heuristics rarely use their randomness, so games from different seeds can all be the same. To vary them, the
+    first opening_moves moves are random, and after that each move is random with probability epsilon, from a stream
+    of their own so the heuristics' randomness is unchanged."""
+    state = new_game(graph, teams, red_base, blue_base, distances, seed)
+    explore = random.Random(None if seed is None else f"explore:{seed}")
+    if weights is not None:
+        state.weights.update(weights)
+    state.max_turns = max_turns
+    state.repetition_limit = repetition_limit
+
+    # Play until there is a winner or the game is drawn
+    if observer is not None:
+        observer.start(state)
+    while state.winner is None:
+        move = exploring_move(state, explore, opening_moves, epsilon) if opening_moves or epsilon else None
+        if move is None:
+            player = state.play_turn()
+        else:
+            player = move[0]
+            state.move_player(*move)
+        if observer is not None:
+            observer.turn(state, player)
+    if observer is not None:
+        observer.finish(state)
+
+    return GameResult(state.winner, state.turn_count, state.captures, state.resets, state.repetitions, state.draw_reason)
+
 def main():
     """Run the game"""
     random.seed(42) # For reproducibility
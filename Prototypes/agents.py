@@ -0,0 +1,215 @@
+# FILE:         agents.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  A common interface for everything that can choose moves in the Prototype3 game.
+#               An agent has a choose(state, deadline) method returning the (player, node) to move, where the deadline
+#               is a time.perf_counter() time (or None for no limit). The built-in heuristics and random moves are
+#               wrapped as agents here, and the alpha-beta, MCTS and tablebase agents take a deadline directly, with
+#               the searches returning their best move so far when it is reached.
+#               DeadlineAgent wraps any agent to record how long each move takes, and to cut it off at a time limit:
+#               the agent runs in a background thread on its own copy of the state, and if it overruns, its best move so
+#               far (or a random move) is played instead. The move comes back close to the limit however slow the agent,
+#               but not exactly on it: thread switches and garbage collection pauses can add to it (see DeadlineAgent).
+
+import argparse
+import gc
+import importlib
+import random
+import threading
+import time
+import board
+from distances import make_distances
+from profiling import percentile
+
+game = importlib.import_module("Prototype3-Teams")
+
+class HeuristicAgent:
+    """The built-in heuristics: the best scoring player makes its balanced_move"""
+    def choose(self, state, deadline=None):
+        """Return the (player, node) move the heuristics would make"""
+        return game.heuristic_policy(state)
+
+class RandomAgent:
+    """Moves a random player to a random neighbour"""
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def choose(self, state, deadline=None):
+        """Return a random (player, node) move"""
+        return game.random_policy(state, self.rng)
+
+class DeadlineAgent:
+    """Records the time an agent takes for each move, and if a budget (in seconds) is given, cuts the agent off once
+    it is used up. The agent is run in a thread on a copy of the state; when it overruns, its best_so_far(copy) move (if
+    it has one) or a random move is played instead.
+    This is not a hard limit. Once the budget is up, the move comes back as soon as this thread gets to run again:
+    usually within the interpreter's thread switch interval (sys.getswitchinterval(), 5 ms), but a garbage collection
+    that starts meanwhile stops every thread until it finishes, which takes longer the more the agent keeps in memory
+    (its search tree or transposition table) and can run to tens of milliseconds.
+    The overrunning thread can't be stopped, so it is left to finish in the background on its copy (its move is thrown
+    away), and the agent isn't asked again until it has, with random moves played in the meantime.
+    An error raised by the agent within the budget is raised again here; errors from abandoned threads are kept in
+    late_errors.
+    With pause_gc, automatic garbage collection is turned off while the agent is on the clock (and put back as it was
+    afterwards), which keeps collections from holding up the answer, but it changes the whole interpreter, so it is
+    opt in."""
+    def __init__(self, agent, budget=None, margin=0.005, seed=None, pause_gc=False):
+        self.agent = agent
+        self.budget = budget
+        self.margin = margin        # Time kept back from the budget for the agent's answer to come back
+        self.pause_gc = pause_gc
+        self.fallback = RandomAgent(seed)
+        self.latencies = []         # Seconds taken by each move
+        self.overruns = 0           # Moves where the agent hit the hard limit
+        self.skipped = 0            # Moves made while an overrunning agent was still busy
+        self.late_errors = []       # Errors raised by agents after they were abandoned
+        self.thread = None
+        self.abandoned = None       # The outcome list of the abandoned thread, to collect its error once it finishes
+
+    def choose(self, state, deadline=None):
+        """Return the agent's move, within the budget"""
+        start = time.perf_counter()
+        if self.budget is not None:
+            limit = start + self.budget
+            deadline = limit if deadline is None else min(deadline, limit)
+        if deadline is None:
+            move = self.agent.choose(state, None)
+        else:
+            move = self.choose_before(state, deadline)
+        self.latencies.append(time.perf_counter() - start)
+        return move
+
+    def choose_before(self, state, deadline):
+        """Run the agent in a thread, and fall back if it hasn't finished by the hard limit"""
+        if self.thread is not None and self.thread.is_alive():
+            self.skipped += 1
+            return self.fallback.choose(state)
+        if self.abandoned:
+            # The abandoned thread has finished since, so keep its error (if it raised one)
+            finished, value = self.abandoned[0]
+            if not finished:
+                self.late_errors.append(value)
+        self.abandoned = None
+        outcome = []    # (True, move) or (False, error), once the agent has finished
+        def run():
+            try:
+                # The agent is asked to finish a little early, so it has the chance to answer before the limit
+                outcome.append((True, self.agent.choose(view, deadline - self.margin)))
+            except Exception as error:
+                outcome.append((False, error))
+        collecting = self.pause_gc and gc.isenabled()
+        if collecting:
+            gc.disable()
+        try:
+            # The agent gets its own copy of the state, so a thread left running after an overrun never sees the game
+            # move on underneath it (taken once collection is paused, as copying can set one off)
+            view = state.copy()
+            self.thread = threading.Thread(target=run, daemon=True)
+            self.thread.start()
+            self.thread.join(max(0.0, deadline - time.perf_counter()))
+            # Collection stays paused until the move is ready, as anything allocated here could set one off
+            if outcome:
+                finished, value = outcome[0]
+                if not finished:
+                    raise value
+                # Carry on the agent's random stream, so the game goes on as if it had been played on the state itself
+                state.rng.setstate(view.rng.getstate())
+                return self.on_state(value, view, state)
+            self.overruns += 1
+            self.abandoned = outcome
+            best_so_far = getattr(self.agent, "best_so_far", None)
+            move = best_so_far(view) if best_so_far is not None else None
+            return self.on_state(move, view, state) if move is not None else self.fallback.choose(state)
+        finally:
+            if collecting:
+                gc.enable()
+
+    @staticmethod
+    def on_state(move, view, state):
+        """Map a move chosen on the copy of the state to the same player of the state itself"""
+        player, node = move
+        return (state.red + state.blue)[(view.red + view.blue).index(player)], node
+
+    def summary(self):
+        """Return the move count, mean, percentile and worst latencies (in milliseconds), and the overruns"""
+        ordered = sorted(self.latencies)
+        return {
+            "moves": len(ordered),
+            "mean_ms": 1000 * sum(ordered) / len(ordered) if ordered else 0.0,
+            "p50_ms": 1000 * percentile(ordered, 0.5),
+            "p99_ms": 1000 * percentile(ordered, 0.99),
+            "max_ms": 1000 * (ordered[-1] if ordered else 0.0),
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "late_errors": len(self.late_errors),
+        }
+
+def make_agent(name, graph, distances=None, seed=0, team_size=None):
+    """Build an agent by name: heuristic, random, alphabeta, mcts or tablebase (which is solved for a team size)"""
+    if name == "heuristic":
+        return HeuristicAgent()
+    if name == "random":
+        return RandomAgent(seed)
+    if name == "alphabeta":
+        from game_tree import AlphaBetaAgent
+        return AlphaBetaAgent(graph, distances, seed=seed)
+    if name == "mcts":
+        from mcts import MCTSAgent
+        return MCTSAgent(graph, distances, iterations=10**9, seed=seed)   # Bounded by the deadline instead
+    if name == "tablebase":
+        import tablebase
+        return tablebase.TablebaseAgent(tablebase.open_tablebase(graph, team_size))
+    raise ValueError(f"Unknown agent: {name}")
+
+def play(graph, agents, team_size, seed=None, max_turns=500, budget=None, pause_gc=False, distances=None):
+    """Play a game between two agents ({"red": agent, "blue": agent}), each limited to budget seconds a move.
+    Returns the winner and the DeadlineAgent wrapping each team's agent, which hold their latencies."""
+    state = game.new_game(graph, team_size, distances=distances, seed=seed)
+    state.max_turns = max_turns
+    timed = {team: DeadlineAgent(agent, budget, seed=seed, pause_gc=pause_gc) for team, agent in agents.items()}
+    while state.winner is None:
+        player, node = timed[state.turn].choose(state)
+        state.move_player(player, node)
+    return state.winner, timed
+
+def main():
+    """Play two agents against each other with a time budget for each move, and report their latencies"""
+    parser = argparse.ArgumentParser(description="Play Prototype3 agents against each other with a hard time limit per move.")
+    parser.add_argument("--red", default="heuristic", help="heuristic, random, alphabeta, mcts or tablebase")
+    parser.add_argument("--blue", default="heuristic")
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--height", type=int, default=3)
+    parser.add_argument("--team-size", type=int, default=2)
+    parser.add_argument("--budget", type=float, default=0.05, help="seconds allowed for each move")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--pause-gc", action="store_true", help="turn off garbage collection while an agent is thinking")
+    args = parser.parse_args()
+
+    graph = board.grid(args.width, args.height)
+    distances = make_distances(graph)
+    results = {"Red": 0, "Blue": 0, "Draw": 0}
+    summaries = {"red": [], "blue": []}
+    agents = {team: make_agent(name, graph, distances, team_size=args.team_size)
+              for team, name in (("red", args.red), ("blue", args.blue))}
+    for seed in range(args.games):
+        winner, timed = play(graph, agents, args.team_size, seed, args.max_turns, args.budget, args.pause_gc, distances)
+        results[winner] += 1
+        for team in summaries:
+            summaries[team].append(timed[team])
+
+    print(f"{args.red} (red) against {args.blue} (blue): {results}")
+    for team in ("red", "blue"):
+        combined = DeadlineAgent(None)
+        for timed in summaries[team]:
+            combined.latencies.extend(timed.latencies)
+            combined.overruns += timed.overruns
+            combined.skipped += timed.skipped
+            combined.late_errors.extend(timed.late_errors)
+        summary = combined.summary()
+        print(f"{team:>5}: {summary['moves']} moves, mean {summary['mean_ms']:.2f} ms, p50 {summary['p50_ms']:.2f} ms, "
+              f"p99 {summary['p99_ms']:.2f} ms, max {summary['max_ms']:.2f} ms, "
+              f"{summary['overruns']} overruns, {summary['skipped']} skipped, {summary['late_errors']} late errors")
+
+if __name__ == "__main__":
+    main()
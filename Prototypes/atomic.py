@@ -0,0 +1,39 @@
+# FILE:         atomic.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Saving files and directories so that other processes never see them half written.
+#               Everything is written under a temporary name next to where it belongs (unique to the process), then
+#               renamed into place once it is complete. A rename within a directory is atomic, so a reader finds either
+#               nothing (or the old version) or the whole of the new one, never a part.
+
+from contextlib import contextmanager
+import os
+import shutil
+
+@contextmanager
+def atomic_file(path, mode="w"):
+    """Open a file to write in place of path, which is only replaced once the block finishes without an error"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, mode) as file:
+            yield file
+    except BaseException:
+        os.remove(temporary)
+        raise
+    os.replace(temporary, path)
+
+@contextmanager
+def atomic_directory(path):
+    """Yield a temporary directory to fill in, renamed to path once the block finishes without an error.
+    If another process saved path first, theirs is kept and this one thrown away, as both hold the same thing."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(temporary, exist_ok=True)
+    try:
+        yield temporary
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+    try:
+        os.rename(temporary, path)
+    except OSError:
+        shutil.rmtree(temporary)   # Another process saved the same thing first
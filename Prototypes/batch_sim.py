@@ -0,0 +1,155 @@
+# FILE:         batch_sim.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Simulate thousands of Prototype3 games at once on a fixed board using NumPy.
+#               Every game is stored as a row of arrays (player positions, flag carriers, turn), and a single step
+#               moves one player in every unfinished game, applying the same pickup, interception, safe zone and
+#               win rules as GameState.check_movement and check_win.
+#               The board is stored as CSR adjacency (offsets and neighbours) along with a precomputed next hop table,
+#               read through field() so any of the distance oracles can be used. Players are moved by a simple policy: usually a step towards their target, otherwise
+#               a random neighbour.
+
+import argparse
+import importlib
+import time
+import numpy as np
+from board import Board
+from compact_state import RED, BLUE, NO_PLAYER
+from distances import make_distances
+
+game = importlib.import_module("Prototype3-Teams")
+
+def csr_adjacency(graph):
+    """Return the (offsets, neighbours) arrays of an integer labelled graph"""
+    if isinstance(graph, Board):
+        # Boards are already stored this way
+        return np.array(graph.offsets, dtype=np.int64), np.array(graph.neighbours, dtype=np.int32)
+    num_nodes = graph.number_of_nodes()
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    neighbours = []
+    for node in range(num_nodes):
+        node_neighbours = list(graph.neighbors(node))
+        neighbours.extend(node_neighbours)
+        offsets[node + 1] = offsets[node] + len(node_neighbours)
+    return offsets, np.array(neighbours, dtype=np.int32)
+
+class BatchSimulator:
+    def __init__(self, graph, team_size, red_base=None, blue_base=None, distances=None, greedy=0.8):
+        num_nodes = graph.number_of_nodes()
+        self.red_base = 0 if red_base is None else red_base
+        self.blue_base = num_nodes - 1 if blue_base is None else blue_base
+        self.bases = np.array([self.red_base, self.blue_base], dtype=np.int32)
+        self.team_size = team_size
+        self.greedy = greedy
+
+        # Board arrays
+        self.offsets, self.neighbours = csr_adjacency(graph)
+        self.degrees = np.diff(self.offsets)
+        distances = distances if distances is not None else make_distances(graph)
+        # Indexed [target, node]. Every game needs a row for every target, so this is built in full
+        self.next_hop = np.array([distances.field(target)[1] for target in range(num_nodes)], dtype=np.int32)
+
+        # Starting positions, red players first then blue, as in CompactState
+        red_positions = game.positions(graph, self.red_base, team_size)
+        blue_positions = game.positions(graph, self.blue_base, team_size)
+        self.start = np.array(red_positions + blue_positions, dtype=np.int32)
+
+    def reset(self, num_games, seed=0):
+        """Start num_games new games"""
+        self.rng = np.random.default_rng(seed)
+        self.positions = np.tile(self.start, (num_games, 1))                    # (games, players)
+        self.carriers = np.full((num_games, 2), NO_PLAYER, dtype=np.int32)    # Carrier of (red flag, blue flag)
+        self.turn = np.zeros(num_games, dtype=np.int32)
+        self.turn_count = np.zeros(num_games, dtype=np.int32)
+        self.winner = np.full(num_games, NO_PLAYER, dtype=np.int32)
+        self.active = np.arange(num_games)   # Games that are still being played
+
+    def choose_moves(self, games):
+        """Pick a player and a node to move them to in each of the given games"""
+        count = len(games)
+        turn = self.turn[games]
+        player = self.rng.integers(0, self.team_size, count) + turn * self.team_size
+        position = self.positions[games, player]
+
+        # A random neighbour of the current position
+        random_node = self.neighbours[self.offsets[position] + (self.rng.random(count) * self.degrees[position]).astype(np.int64)]
+
+        # The player's target: home if carrying the flag, the carrier if the team's flag is taken, else the enemy flag
+        enemy = 1 - turn
+        own_carrier = self.carriers[games, turn]
+        enemy_carrier = self.carriers[games, enemy]
+        enemy_flag = np.where(enemy_carrier == NO_PLAYER, self.bases[enemy], self.positions[games, np.maximum(enemy_carrier, 0)])
+        target = np.where(own_carrier != NO_PLAYER, self.positions[games, np.maximum(own_carrier, 0)], enemy_flag)
+        target = np.where(enemy_carrier == player, self.bases[turn], target)
+        greedy_node = self.next_hop[target, position]
+        greedy_node = np.where(greedy_node == position, random_node, greedy_node)   # Already on the target
+
+        node = np.where(self.rng.random(count) < self.greedy, greedy_node, random_node)
+        return player, node
+
+    def apply_moves(self, games, player, node):
+        """Move the players and apply the rules of the game in each of the given games"""
+        turn = self.turn[games]
+        enemy = 1 - turn
+        self.positions[games, player] = node
+
+        # If the player lands on the opponent carrying the team's flag, and they aren't safe, reset the flag
+        own_carrier = self.carriers[games, turn]
+        safe = (node == self.red_base) | (node == self.blue_base)
+        intercepted = (own_carrier != NO_PLAYER) & (self.positions[games, np.maximum(own_carrier, 0)] == node) & ~safe
+        self.carriers[games[intercepted], turn[intercepted]] = NO_PLAYER
+        # Pick up the enemy flag from its base
+        picked_up = (self.carriers[games, enemy] == NO_PLAYER) & (node == self.bases[enemy])
+        self.carriers[games[picked_up], enemy[picked_up]] = player[picked_up]
+
+        # A flag is captured when its carrier reaches their own base (the red flag is checked first, as in check_win)
+        red_carrier = self.carriers[games, RED]
+        blue_carrier = self.carriers[games, BLUE]
+        red_captured = (red_carrier != NO_PLAYER) & (self.positions[games, np.maximum(red_carrier, 0)] == self.blue_base)
+        blue_captured = (blue_carrier != NO_PLAYER) & (self.positions[games, np.maximum(blue_carrier, 0)] == self.red_base)
+        self.winner[games] = np.where(red_captured, BLUE, np.where(blue_captured, RED, NO_PLAYER))
+
+        self.turn[games] = enemy
+        self.turn_count[games] += 1
+
+    def step(self, max_turns=None):
+        """Play one turn in every unfinished game, then drop the games that have finished"""
+        games = self.active
+        player, node = self.choose_moves(games)
+        self.apply_moves(games, player, node)
+        # Mask out games that have been won or have reached the turn limit
+        still_playing = self.winner[games] == NO_PLAYER
+        if max_turns is not None:
+            still_playing &= self.turn_count[games] < max_turns
+        self.active = games[still_playing]
+        return len(games)
+
+    def run(self, num_games, max_turns=1000, seed=0):
+        """Play num_games games to the end, returning the winners, turn counts and total turns played"""
+        self.reset(num_games, seed)
+        total_turns = 0
+        while len(self.active):
+            total_turns += self.step(max_turns)
+        return self.winner, self.turn_count, total_turns
+
+def main():
+    """Measure the simulation speed on the default board"""
+    parser = argparse.ArgumentParser(description="Simulate many Prototype3 games at once with NumPy.")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--team-size", type=int, default=3)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--greedy", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = BatchSimulator(game.build_graph(), args.team_size, greedy=args.greedy)
+    start = time.perf_counter()
+    winner, turns, total_turns = simulator.run(args.games, args.max_turns, args.seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.games} games, {total_turns} turns in {elapsed:.2f}s ({total_turns / elapsed:,.0f} turns/s)")
+    print(f"Red wins: {np.mean(winner == RED):.3f}, Blue wins: {np.mean(winner == BLUE):.3f}, "
+          f"unfinished: {np.mean(winner == NO_PLAYER):.3f}, mean length: {turns.mean():.1f}")
+
+if __name__ == "__main__":
+    main()
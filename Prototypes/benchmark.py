@@ -0,0 +1,198 @@
+# FILE:         benchmark.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  A reproducible benchmark of the Prototype3 engine (Player/GameState and the heuristics).
+#               Plays a fixed matrix of boards (grids from the 4x3 build_graph board up to 1000x1000, cycles, paths
+#               and random graphs) and team sizes with fixed seeds, measuring turns per second, decision latency
+#               percentiles and peak memory.
+#               Results are saved as JSON, and can be compared against a saved baseline to catch slowdowns. Each repeat
+#               is timed against a fixed calibration loop run around it, and the median repeat compared, since the raw
+#               times of back to back runs on a busy machine can differ by more than half.
+
+from collections import namedtuple
+import argparse
+import gc
+import importlib
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import networkx as nx
+import board
+from profiling import percentile
+from distances import make_distances
+
+game = importlib.import_module("Prototype3-Teams")
+
+# One board and team size to be benchmarked
+Case = namedtuple("Case", ["board", "team_size"])
+
+# Every board is built from a fixed seed, so each run plays exactly the same games
+BOARDS = {
+    "grid-4x3": game.build_graph,
+    "grid-10x10": lambda: board.grid(10, 10),
+    "grid-32x32": lambda: board.grid(32, 32),
+    "grid-100x100": lambda: board.grid(100, 100),
+    "grid-316x316": lambda: board.grid(316, 316),
+    "grid-1000x1000": lambda: board.grid(1000, 1000),
+    "cycle-100": lambda: board.cycle(100),
+    "cycle-10000": lambda: board.cycle(10000),
+    "path-100": lambda: board.path(100),
+    "path-10000": lambda: board.path(10000),
+    "random-1000": lambda: board.Board.from_graph(nx.connected_watts_strogatz_graph(1000, 4, 0.1, seed=1)),
+    "random-100000": lambda: board.Board.from_graph(nx.connected_watts_strogatz_graph(100000, 4, 0.1, seed=1)),
+}
+
+# The quick matrix runs in seconds, the full one covers every board and team size
+MATRICES = {
+    "quick": [Case(name, team_size) for name in ["grid-4x3", "grid-10x10", "grid-32x32", "cycle-100", "path-100", "random-1000"]
+              for team_size in [1, 4, 16]],
+    "full": [Case(name, team_size) for name in BOARDS for team_size in [1, 4, 16, 64]],
+}
+
+def play(state, max_turns):
+    """Play one game, returning the time taken by each turn and by the whole game"""
+    latencies = []
+    # Like timeit, keep the garbage collector from landing its pauses on whichever repeat it happens to
+    gc.collect()
+    gc.disable()
+    try:
+        game_start = time.perf_counter()
+        while state.winner is None and state.turn_count < max_turns:
+            start = time.perf_counter()
+            state.play_turn()
+            latencies.append(time.perf_counter() - start)
+        total = time.perf_counter() - game_start
+    finally:
+        gc.enable()
+    return latencies, total, state.winner
+
+def calibrate(iterations=20000):
+    """Time a fixed piece of pure Python, to measure how fast the machine is running at the moment"""
+    start = time.perf_counter()
+    total = 0
+    for i in range(iterations):
+        total += i * i
+    return time.perf_counter() - start
+
+def run_case(case, graph, seed, max_turns, measure_memory, repeats=5, min_seconds=1.0):
+    """Benchmark one board and team size, replaying the same game (at least repeats times and for at least min_seconds)
+    to smooth out noise"""
+    latencies = []
+    totals = []
+    relative = []   # Each repeat's time over the calibration time around it, which cancels out the machine's speed changing
+    # The distances are set up once and shared by the repeats, as they would be by the games of a tournament
+    setup_start = time.perf_counter()
+    distances = make_distances(graph)
+    setup = time.perf_counter() - setup_start
+    play(game.new_game(graph, case.team_size, distances=distances, seed=seed), max_turns)   # Warm up the distances' memos first
+    finish = time.perf_counter() + min_seconds
+    while len(totals) < repeats or time.perf_counter() < finish:
+        state = game.new_game(graph, case.team_size, distances=distances, seed=seed)   # Set up before the clock starts
+        calibration = calibrate()
+        game_latencies, total, winner = play(state, max_turns)
+        calibration = (calibration + calibrate()) / 2
+        latencies.extend(game_latencies)
+        totals.append(total)
+        relative.append(total / calibration)
+    latencies.sort()
+    totals.sort()
+    relative.sort()
+    turns = len(latencies) // len(totals)
+    result = {
+        "board": case.board,
+        "team_size": case.team_size,
+        "nodes": graph.number_of_nodes(),
+        "turns": turns,
+        "winner": winner,
+        "setup_seconds": setup,
+        "repeats": len(totals),
+        "turns_per_second": turns / totals[0] if totals[0] else 0.0,   # From the fastest repeat, the least disturbed
+        "median_turns_per_second": turns / totals[len(totals) // 2] if totals[len(totals) // 2] else 0.0,
+        # Turns played in the time of one calibration run, from the median repeat: what compare() checks
+        "relative_speed": turns / relative[len(relative) // 2] if relative[len(relative) // 2] else 0.0,
+        "latency_ms": {name: 1000 * percentile(latencies, fraction)
+                       for name, fraction in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)]},
+    }
+    if measure_memory:
+        # Measure memory in a separate run, since tracing allocations slows everything down, with fresh distances so
+        # their tables are counted
+        tracemalloc.start()
+        play(game.new_game(graph, case.team_size, distances=make_distances(graph), seed=seed), max_turns)
+        result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+def environment():
+    """Describe the machine and code version the benchmark was run on"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": sys.version.split()[0], "platform": platform.platform(), "networkx": nx.__version__, "commit": commit}
+
+def compare(results, baseline, threshold):
+    """Print the change in each case against the baseline, returning True if any case got slower than the threshold.
+    The change is in relative speed, which is steadier between runs than turns per second (baselines saved before it
+    was recorded fall back to turns per second)"""
+    previous = {(row["board"], row["team_size"]): row for row in baseline["results"]}
+    regressed = False
+    print(f"{'board':<16}{'team':>6}{'turns/s':>14}{'baseline':>14}{'change':>9}{'p50 ms':>10}{'baseline':>10}")
+    for row in results:
+        old = previous.get((row["board"], row["team_size"]))
+        speed = "relative_speed" if old is not None and "relative_speed" in old else "turns_per_second"
+        if old is None or not old[speed]:
+            continue
+        change = row[speed] / old[speed] - 1
+        flag = ""
+        if change < -threshold:
+            regressed = True
+            flag = "  SLOWER"
+        print(f"{row['board']:<16}{row['team_size']:>6}{row['turns_per_second']:>14.1f}{old['turns_per_second']:>14.1f}"
+              f"{change:>+9.1%}{row['latency_ms']['p50']:>10.3f}{old['latency_ms']['p50']:>10.3f}{flag}")
+    return regressed
+
+def main():
+    """Run the benchmark matrix"""
+    parser = argparse.ArgumentParser(description="Benchmark the Prototype3 engine.")
+    parser.add_argument("--matrix", choices=sorted(MATRICES), default="quick")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=5, help="minimum number of times to play each game")
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="minimum time to spend playing each game")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="slowdown (as a fraction) that counts as a regression; back to back runs differ by up to 20%%")
+    args = parser.parse_args()
+
+    results = []
+    graphs = {}
+    for case in MATRICES[args.matrix]:
+        # Only keep the current board in memory, since the largest take a lot of space
+        if case.board not in graphs:
+            graphs = {case.board: BOARDS[case.board]()}
+        graph = graphs[case.board]
+        if graph.number_of_nodes() < 2 * case.team_size:
+            continue   # Not enough room for both teams
+        result = run_case(case, graph, args.seed, args.max_turns, not args.no_memory, args.repeats, args.min_seconds)
+        results.append(result)
+        print(f"{case.board:<16} team {case.team_size:>3}: {result['turns_per_second']:10.1f} turns/s, "
+              f"p50 {result['latency_ms']['p50']:.3f} ms, p99 {result['latency_ms']['p99']:.3f} ms"
+              + (f", peak {result['peak_memory_mb']:.2f} MB" if "peak_memory_mb" in result else ""))
+
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment(), "matrix": args.matrix, "seed": args.seed, "max_turns": args.max_turns,
+                   "results": results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
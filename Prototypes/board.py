@@ -0,0 +1,194 @@
+# FILE:         board.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Compact integer indexed boards for the Prototype3 game.
+#               Each board is stored as CSR adjacency: a flat array of every node's neighbours, and an array of offsets
+#               giving where each node's neighbours start, so a node costs a few bytes rather than the hundreds used by
+#               networkx's dicts.
+#               The builders generate grids, cycles, paths, complete bipartite and random graphs straight into these
+#               arrays, with the same node labels and neighbour order as the networkx generators (relabelled to
+#               integers where their labels aren't already, as for grids), so games play out exactly the same on either.
+#               Boards provide the parts of the networkx graph interface used by the game (neighbors, nodes,
+#               number_of_nodes, edges), and can be converted to a networkx graph for drawing.
+
+from array import array
+import math
+import random
+import networkx as nx
+
+class Board:
+    """An undirected graph on the nodes 0..n-1, stored as CSR adjacency"""
+    def __init__(self, offsets, neighbours):
+        self.offsets = offsets          # Node i's neighbours are neighbours[offsets[i]:offsets[i+1]]
+        self.neighbours = neighbours
+
+    @classmethod
+    def from_adjacency(cls, adjacency):
+        """Build a board from the list of neighbours of each node, keeping their order"""
+        offsets = array("Q" if sum(len(node_neighbours) for node_neighbours in adjacency) > 0xFFFFFFFF else "I", [0])
+        neighbours = array("I")
+        for node_neighbours in adjacency:
+            neighbours.extend(node_neighbours)
+            offsets.append(len(neighbours))
+        return cls(offsets, neighbours)
+
+    @classmethod
+    def from_edges(cls, num_nodes, edges):
+        """Build a board from a list of (u, v) edges, with each node's neighbours in the order the edges are listed,
+        as networkx does when the edges are added one at a time"""
+        # Count each node's neighbours first, so the arrays can be filled in place without a list per node
+        degrees = array("I", bytes(4 * num_nodes))
+        for u, v in edges:
+            degrees[u] += 1
+            degrees[v] += 1
+        total = sum(degrees)
+        offsets = array("Q" if total > 0xFFFFFFFF else "I", [0])
+        for degree in degrees:
+            offsets.append(offsets[-1] + degree)
+        neighbours = array("I", bytes(4 * total))
+        cursor = offsets[:-1]   # Where the next neighbour of each node goes
+        for u, v in edges:
+            neighbours[cursor[u]] = v
+            cursor[u] += 1
+            neighbours[cursor[v]] = u
+            cursor[v] += 1
+        return cls(offsets, neighbours)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Convert a networkx graph with nodes labelled 0..n-1"""
+        return cls.from_adjacency([list(graph.neighbors(node)) for node in range(graph.number_of_nodes())])
+
+    def neighbors(self, node):
+        """Return the neighbours of a node"""
+        return self.neighbours[self.offsets[node]:self.offsets[node + 1]]
+
+    def __getitem__(self, node):
+        """Return the neighbours of a node, like graph[node] in networkx"""
+        return self.neighbours[self.offsets[node]:self.offsets[node + 1]]
+
+    def degree(self, node):
+        """Return the number of neighbours of a node"""
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def nodes(self):
+        """Return the nodes, which are always 0..n-1"""
+        return range(len(self.offsets) - 1)
+
+    def number_of_nodes(self):
+        """Return the number of nodes"""
+        return len(self.offsets) - 1
+
+    def number_of_edges(self):
+        """Return the number of (undirected) edges"""
+        return len(self.neighbours) // 2
+
+    def edges(self):
+        """Yield each edge once, as (u, v) with u < v"""
+        for node in range(len(self.offsets) - 1):
+            for neighbour in self.neighbors(node):
+                if node < neighbour:
+                    yield node, neighbour
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return iter(range(len(self.offsets) - 1))
+
+    def __contains__(self, node):
+        return isinstance(node, int) and 0 <= node < len(self.offsets) - 1
+
+    def memory_bytes(self):
+        """Return the number of bytes used by the adjacency arrays"""
+        return self.offsets.itemsize * len(self.offsets) + self.neighbours.itemsize * len(self.neighbours)
+
+    def to_networkx(self):
+        """Convert the board to a networkx graph, e.g. for drawing"""
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes())
+        graph.add_edges_from(self.edges())
+        return graph
+
+def grid(width, height):
+    """A width x height grid, matching build_graph (nx.grid_2d_graph relabelled to integers)"""
+    # Relabelling rebuilds the graph from its edges, which are listed node by node, so each node's neighbours are
+    # in the order: up, left (both from edges listed by earlier nodes), down, right
+    offsets = array("I", [0])
+    neighbours = array("I")
+    for i in range(width):
+        for j in range(height):
+            node = i * height + j
+            if i > 0:
+                neighbours.append(node - height)
+            if j > 0:
+                neighbours.append(node - 1)
+            if i < width - 1:
+                neighbours.append(node + height)
+            if j < height - 1:
+                neighbours.append(node + 1)
+            offsets.append(len(neighbours))
+    return Board(offsets, neighbours)
+
+def cycle(num_nodes):
+    """A cycle, matching nx.cycle_graph"""
+    if num_nodes < 3:
+        return path(num_nodes)
+    # networkx lists the edges around the cycle, finishing with the one back to node 0
+    edges = [(node, node + 1) for node in range(num_nodes - 1)] + [(num_nodes - 1, 0)]
+    return Board.from_edges(num_nodes, edges)
+
+def path(num_nodes):
+    """A path, matching nx.path_graph"""
+    return Board.from_edges(num_nodes, [(node, node + 1) for node in range(num_nodes - 1)])
+
+def bipartite(left, right):
+    """A complete bipartite graph, matching nx.complete_bipartite_graph"""
+    adjacency = [list(range(left, left + right))] * left + [list(range(left))] * right
+    return Board.from_adjacency(adjacency)
+
+def random_graph(num_nodes, seed=0):
+    """A connected nx.gnp_random_graph, with an edge probability just above the connectivity threshold, retrying until
+    the generated graph is connected"""
+    rng = random.Random(seed)
+    probability = min(1.0, 2 * math.log(max(num_nodes, 2)) / num_nodes)
+    while True:
+        graph = nx.gnp_random_graph(num_nodes, probability, seed=rng.randrange(2**32))
+        if nx.is_connected(graph):
+            return Board.from_graph(graph)
+
+# Graph families from the game rules, each built from a size and a seed (only used by random graphs). The tournament,
+# catalogue and training tools all build their boards from here, so the same family, size and seed is the same board
+GRAPH_FAMILIES = {
+    "grid": lambda size, seed: grid(size, size),
+    "cycle": lambda size, seed: cycle(size),
+    "path": lambda size, seed: path(size),
+    "bipartite": lambda size, seed: bipartite(size, size),
+    "random": random_graph,
+}
+
+# Each builder with the networkx generator it matches, to check the neighbour orders agree
+NETWORKX_BUILDERS = {
+    "grid": (lambda size: grid(size, size + 1), lambda size: nx.grid_2d_graph(size, size + 1)),
+    "cycle": (cycle, nx.cycle_graph),
+    "path": (path, nx.path_graph),
+    "bipartite": (lambda size: bipartite(size, size + 1), lambda size: nx.complete_bipartite_graph(size, size + 1)),
+}
+
+def check_builders(sizes=range(2, 12)):
+    """Check every builder gives each node the same neighbours, in the same order, as its networkx generator.
+    The order matters as well as the neighbours, since it breaks ties between equally short paths."""
+    for name, (builder, generator) in NETWORKX_BUILDERS.items():
+        for size in sizes:
+            board = builder(size)
+            graph = generator(size)
+            if not all(isinstance(node, int) for node in graph):
+                graph = nx.convert_node_labels_to_integers(graph)   # Relabelling reorders neighbours, so only for grids
+            for node in graph.nodes():
+                if list(board.neighbors(node)) != list(graph.neighbors(node)):
+                    raise AssertionError(f"{name}({size}) node {node} has neighbours {list(board.neighbors(node))}, "
+                                         f"networkx has {list(graph.neighbors(node))}")
+    print(f"Builders match networkx: {', '.join(NETWORKX_BUILDERS)}")
+
+if __name__ == "__main__":
+    check_builders()
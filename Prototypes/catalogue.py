@@ -0,0 +1,225 @@
+# FILE:         catalogue.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  An on-disk catalogue of boards with their all-pairs distances precomputed.
+#               Each board is saved once, in a directory named by a hash of its adjacency, holding its CSR arrays,
+#               its distance and next step tables (as .npy files) and a meta.json with its bases and starting positions.
+#               The arrays are opened with memory mapping, so any number of simulation processes share one copy in
+#               the page cache rather than each running its own all-pairs BFS.
+#               Distances are stored in 1 byte entries when the board is small enough, otherwise 2 (or 4) bytes.
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import board
+from atomic import atomic_directory
+from board import Board
+from distances import BreadthFirstDistances
+
+game = importlib.import_module("Prototype3-Teams")
+
+# Where boards are saved, which can be changed with the CTF_CATALOGUE environment variable
+CATALOGUE = os.environ.get("CTF_CATALOGUE", os.path.join(os.path.expanduser("~"), ".cache", "ctf_catalogue"))
+
+def board_hash(graph):
+    """Return a hash of the board's adjacency, used as its key in the catalogue"""
+    digest = hashlib.sha256()
+    digest.update(np.asarray(graph.offsets, dtype=np.uint64).tobytes())
+    digest.update(np.asarray(graph.neighbours, dtype=np.uint32).tobytes())
+    return digest.hexdigest()
+
+def distance_dtype(searcher):
+    """Choose the smallest entries that can hold every distance, with the largest value kept for unreachable nodes"""
+    # No shortest path is longer than twice the furthest distance from any one node of its component, so take the
+    # furthest over a BFS of every component (a board that isn't connected can have its longest paths anywhere)
+    seen = bytearray(len(searcher.nodes))
+    furthest = 0
+    for start in range(len(seen)):
+        if seen[start]:
+            continue
+        seen[start] = 1
+        frontier = [start]
+        depth = 0
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for neighbour in searcher.adjacency[node]:
+                    if not seen[neighbour]:
+                        seen[neighbour] = 1
+                        next_frontier.append(neighbour)
+            if next_frontier:
+                depth += 1
+            frontier = next_frontier
+        furthest = max(furthest, depth)
+    if 2 * furthest < 0xFF:
+        return np.uint8
+    if 2 * furthest < 0xFFFF:
+        return np.uint16
+    return np.uint32
+
+class MappedDistances(BreadthFirstDistances):
+    """Distances and next steps read from the memory mapped tables of a catalogue entry, with the same interface
+    (and the same paths) as DistanceOracle"""
+    def __init__(self, graph, distance_table, next_step_table):
+        super().__init__(graph)
+        # Both tables are indexed [target, node], as in DistanceOracle
+        self.distance_table = distance_table
+        self.next_step_table = next_step_table
+        self.unreachable = int(np.iinfo(distance_table.dtype).max)
+
+    def field(self, target):
+        """Return the (distance, next_step) rows for a target index"""
+        # Memory views give plain Python ints when indexed, rather than NumPy scalars
+        return memoryview(self.distance_table[target]), memoryview(self.next_step_table[target])
+
+# The board and tables being filled in by a worker process
+worker_searcher = None
+worker_tables = None
+
+def init_worker(directory):
+    """Open the board and the tables being filled in, once per worker process"""
+    global worker_searcher, worker_tables
+    worker_searcher = BreadthFirstDistances(load_board(directory))
+    worker_tables = (np.load(os.path.join(directory, "distances.npy"), mmap_mode="r+"),
+                     np.load(os.path.join(directory, "next_steps.npy"), mmap_mode="r+"))
+
+def fill_rows(targets):
+    """Run a BFS from each target and write its distances and next steps into the tables"""
+    distance_table, next_step_table = worker_tables
+    dtype = np.uint16 if worker_searcher.typecode == "H" else np.uint32
+    for target in targets:
+        distance, next_step = worker_searcher.bfs(target)
+        distance = np.frombuffer(distance, dtype=dtype)
+        limit = np.iinfo(distance_table.dtype).max
+        if int(distance[distance != worker_searcher.unreachable].max()) >= limit:
+            raise OverflowError(f"Distances from node {target} don't fit in the table's {distance_table.dtype} entries")
+        # Unreachable nodes get the largest value of the (possibly smaller) stored entries
+        distance_table[target] = np.where(distance == worker_searcher.unreachable,
+                                          np.iinfo(distance_table.dtype).max, distance)
+        next_step_table[target] = np.frombuffer(next_step, dtype=dtype)
+    distance_table.flush()
+    next_step_table.flush()
+    return len(targets)
+
+def load_board(directory):
+    """Open a saved board's CSR arrays, memory mapped and viewed so that its neighbours are plain Python ints"""
+    offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+    neighbours = np.load(os.path.join(directory, "neighbours.npy"), mmap_mode="r")
+    return Board(memoryview(offsets), memoryview(neighbours))
+
+class CatalogueEntry:
+    """A board opened from the catalogue, with its distances, bases and starting positions.
+    The tables don't depend on the bases, so other bases than the saved ones can share them, with their starting
+    positions worked out when asked for rather than read from the saved meta data."""
+    def __init__(self, directory, red_base=None, blue_base=None):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as file:
+            self.meta = json.load(file)
+        self.board = load_board(directory)
+        self.distances = MappedDistances(self.board,
+                                         np.load(os.path.join(directory, "distances.npy"), mmap_mode="r"),
+                                         np.load(os.path.join(directory, "next_steps.npy"), mmap_mode="r"))
+        self.red_base = self.meta["red_base"] if red_base is None else red_base
+        self.blue_base = self.meta["blue_base"] if blue_base is None else blue_base
+
+    def positions(self, team_size):
+        """Return the (red, blue) starting positions for a team size, the same as positions() would"""
+        saved_bases = (self.red_base, self.blue_base) == (self.meta["red_base"], self.meta["blue_base"])
+        if team_size > self.meta["max_team_size"] or not saved_bases:
+            return game.positions(self.board, self.red_base, team_size), game.positions(self.board, self.blue_base, team_size)
+        # positions() takes nodes in BFS order from the base, so smaller teams use the start of the saved order
+        return self.meta["red_positions"][:team_size], self.meta["blue_positions"][:team_size]
+
+def store(graph, red_base=None, blue_base=None, max_team_size=64, workers=None, directory=CATALOGUE):
+    """Add a board to the catalogue if it isn't already there, returning its key.
+    The bases only choose which starting positions are saved; an entry is shared by every choice of bases."""
+    if not isinstance(graph, Board):
+        graph = Board.from_graph(graph)
+    key = board_hash(graph)
+    path = os.path.join(directory, key)
+    if os.path.exists(path):
+        return key
+
+    # Build the entry in a temporary directory, then rename it, so other processes never see a half written entry
+    with atomic_directory(path) as temporary:
+        num_nodes = graph.number_of_nodes()
+        red_base = 0 if red_base is None else red_base
+        blue_base = num_nodes - 1 if blue_base is None else blue_base
+        np.save(os.path.join(temporary, "offsets.npy"), np.asarray(graph.offsets))
+        np.save(os.path.join(temporary, "neighbours.npy"), np.asarray(graph.neighbours))
+        searcher = BreadthFirstDistances(graph)
+        np.lib.format.open_memmap(os.path.join(temporary, "distances.npy"), mode="w+",
+                                  dtype=distance_dtype(searcher), shape=(num_nodes, num_nodes)).flush()
+        np.lib.format.open_memmap(os.path.join(temporary, "next_steps.npy"), mode="w+",
+                                  dtype=np.uint16 if searcher.typecode == "H" else np.uint32, shape=(num_nodes, num_nodes)).flush()
+
+        # Fill in the tables a block of targets at a time, across a pool of processes on large boards
+        chunks = [range(start, min(start + 256, num_nodes)) for start in range(0, num_nodes, 256)]
+        if workers == 1 or len(chunks) == 1:
+            init_worker(temporary)
+            for chunk in chunks:
+                fill_rows(chunk)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(temporary,)) as executor:
+                list(executor.map(fill_rows, chunks))
+
+        meta = {
+            "nodes": num_nodes,
+            "edges": graph.number_of_edges(),
+            "red_base": red_base,
+            "blue_base": blue_base,
+            "max_team_size": max_team_size,
+            "red_positions": game.positions(graph, red_base, max_team_size),
+            "blue_positions": game.positions(graph, blue_base, max_team_size),
+        }
+        with open(os.path.join(temporary, "meta.json"), "w") as file:
+            json.dump(meta, file)
+    return key
+
+def load(key, directory=CATALOGUE, red_base=None, blue_base=None):
+    """Open a board in the catalogue by its key, with the saved bases unless others are given"""
+    path = os.path.join(directory, key)
+    if not os.path.exists(path):
+        raise KeyError(f"{key} is not in the catalogue at {directory}")
+    return CatalogueEntry(path, red_base, blue_base)
+
+def open_board(graph, red_base=None, blue_base=None, workers=None, directory=CATALOGUE):
+    """Open a board from the catalogue with the given bases (the first and last nodes by default), adding it first if
+    it isn't there"""
+    red_base = 0 if red_base is None else red_base
+    blue_base = graph.number_of_nodes() - 1 if blue_base is None else blue_base
+    return load(store(graph, red_base, blue_base, workers=workers, directory=directory), directory, red_base, blue_base)
+
+def entries(directory=CATALOGUE):
+    """Return the keys of every board in the catalogue"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if os.path.exists(os.path.join(directory, name, "meta.json")))
+
+def main():
+    """Add boards to the catalogue, or list the boards in it"""
+    parser = argparse.ArgumentParser(description="Manage the catalogue of boards with precomputed distances.")
+    parser.add_argument("command", choices=["add", "list"])
+    parser.add_argument("--family", choices=sorted(board.GRAPH_FAMILIES), default="grid")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[4])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--directory", default=CATALOGUE)
+    args = parser.parse_args()
+
+    if args.command == "add":
+        for size in args.sizes:
+            key = store(board.GRAPH_FAMILIES[args.family](size, args.seed), workers=args.workers, directory=args.directory)
+            print(f"{args.family} {size}: {key}")
+    else:
+        for key in entries(args.directory):
+            entry = load(key, args.directory)
+            print(f"{key}  {entry.meta['nodes']:>8} nodes {entry.meta['edges']:>9} edges  "
+                  f"distances {entry.distances.distance_table.dtype}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# FILE:         compact_state.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  A compact version of the Prototype3 GameState for lookahead and rollouts.
+#               Players are referred to by index (red players first, then blue) and flags store the index of their
+#               carrier, so the whole state is a few small arrays that can be copied cheaply.
+#               Moves can be applied and undone in place, following the rules of check_movement and check_win.
+#               Nodes are expected to be labelled with integers, as they are by build_graph().
+
+from array import array
+
+RED = 0
+BLUE = 1
+NO_PLAYER = -1
+TEAM_NAMES = ("red", "blue")
+WINNER_NAMES = ("Red", "Blue")
+
+class CompactState:
+    __slots__ = ("positions", "teams", "bases", "carriers", "turn", "turn_count", "winner")
+
+    def __init__(self, positions, teams, bases, carriers=(NO_PLAYER, NO_PLAYER), turn=RED, turn_count=0, winner=None):
+        self.positions = array("i", positions)   # Node occupied by each player
+        self.teams = teams                         # Team of each player, shared between clones as it never changes
+        self.bases = tuple(bases)                  # (red base, blue base)
+        self.carriers = array("i", carriers)     # Index of the player carrying (red flag, blue flag), or NO_PLAYER
+        self.turn = turn                           # RED or BLUE
+        self.turn_count = turn_count
+        self.winner = winner                       # None, RED or BLUE
+
+    @classmethod
+    def from_game_state(cls, state):
+        """Build a compact state from a Prototype3 GameState"""
+        players = state.red + state.blue
+        teams = array("b", [RED] * len(state.red) + [BLUE] * len(state.blue))
+        # Flags point at their carrier by index instead of by object
+        carriers = []
+        for flag in (state.red_flag, state.blue_flag):
+            carriers.append(NO_PLAYER if flag.carried_by is None else players.index(flag.carried_by))
+        turn = RED if state.turn == "red" else BLUE
+        winner = None if state.winner is None else WINNER_NAMES.index(state.winner)
+        return cls([player.position for player in players], teams, (state.red_base, state.blue_base),
+                   carriers, turn, state.turn_count, winner)
+
+    def clone(self):
+        """Return an independent copy of the state"""
+        return CompactState(self.positions, self.teams, self.bases, self.carriers, self.turn, self.turn_count, self.winner)
+
+    def players(self, team):
+        """Return the indices of the players on a team"""
+        return [player for player in range(len(self.teams)) if self.teams[player] == team]
+
+    def is_safe(self, node):
+        """Decide whether a node is a safe zone (either base node)"""
+        return node == self.bases[RED] or node == self.bases[BLUE]
+
+    def flag_position(self, team):
+        """Return the node the team's flag is on"""
+        carrier = self.carriers[team]
+        return self.bases[team] if carrier == NO_PLAYER else self.positions[carrier]
+
+    def legal_moves(self, adjacency):
+        """Return every (player, node) move available to the team whose turn it is"""
+        moves = []
+        for player in range(len(self.teams)):
+            if self.teams[player] == self.turn:
+                for node in adjacency[self.positions[player]]:
+                    moves.append((player, node))
+        return moves
+
+    def apply_move(self, player, node):
+        """Move a player and apply the rules of the game, returning a record that undo_move can reverse"""
+        record = (player, self.positions[player], self.carriers[RED], self.carriers[BLUE], self.winner)
+        team = self.turn
+        enemy = 1 - team
+        self.positions[player] = node
+
+        # If the player lands on the opponent carrying the team's flag, and they aren't safe, reset the flag
+        carrier = self.carriers[team]
+        if carrier != NO_PLAYER and self.positions[carrier] == node and not self.is_safe(node):
+            self.carriers[team] = NO_PLAYER
+        # Pick up the enemy flag from its base
+        if self.carriers[enemy] == NO_PLAYER and node == self.bases[enemy]:
+            self.carriers[enemy] = player
+
+        # A flag is captured when its carrier reaches their own base
+        red_carrier = self.carriers[RED]
+        blue_carrier = self.carriers[BLUE]
+        if red_carrier != NO_PLAYER and self.positions[red_carrier] == self.bases[BLUE]:
+            self.winner = BLUE
+        elif blue_carrier != NO_PLAYER and self.positions[blue_carrier] == self.bases[RED]:
+            self.winner = RED
+
+        self.turn = enemy
+        self.turn_count += 1
+        return record
+
+    def undo_move(self, record):
+        """Reverse a move made by apply_move"""
+        player, position, red_carrier, blue_carrier, winner = record
+        self.positions[player] = position
+        self.carriers[RED] = red_carrier
+        self.carriers[BLUE] = blue_carrier
+        self.winner = winner
+        self.turn = 1 - self.turn
+        self.turn_count -= 1
+
+def adjacency_lists(graph):
+    """Return the neighbours of every node as a tuple indexed by node, for integer labelled graphs"""
+    return tuple(tuple(graph.neighbors(node)) for node in range(graph.number_of_nodes()))
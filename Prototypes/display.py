@@ -0,0 +1,188 @@
+# FILE:         display.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Drawing the Prototype3 game, kept apart from the game logic so that headless runs and worker processes
+#               never load matplotlib or compute a layout.
+#               Graph layouts are saved to an on-disk cache keyed by a hash of the graph, so each board only has its
+#               spring layout computed once.
+#               The renderer draws the static graph once and then only restyles the nodes that change, and frames can
+#               be recorded headlessly on a background thread.
+
+from collections import namedtuple
+import hashlib
+import json
+import os
+import queue
+import threading
+import networkx as nx
+from atomic import atomic_file
+from board import Board
+
+# Where layouts are saved, which can be changed with the CTF_LAYOUT_CACHE environment variable
+LAYOUT_CACHE = os.environ.get("CTF_LAYOUT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "ctf_layouts"))
+
+def pyplot():
+    """Import matplotlib only when the game is being drawn"""
+    import matplotlib.pyplot as plt
+    plt.ion()
+    return plt
+
+def drawable(graph):
+    """Return a networkx version of the graph, since the networkx drawing functions can't draw a Board"""
+    return graph.to_networkx() if isinstance(graph, Board) else graph
+
+def graph_hash(graph):
+    """Return a hash that identifies the graph from its nodes and edges"""
+    digest = hashlib.sha256()
+    digest.update(repr(list(graph.nodes())).encode())
+    digest.update(repr(sorted(tuple(sorted((repr(u), repr(v)))) for u, v in graph.edges())).encode())
+    return digest.hexdigest()
+
+def cached_layout(graph, seed=42, cache_dir=LAYOUT_CACHE):
+    """Return the spring layout of the graph, loading it from the cache if it has been computed before"""
+    path = os.path.join(cache_dir, f"{graph_hash(graph)}-{seed}.json")
+    if os.path.exists(path):
+        with open(path) as file:
+            saved = json.load(file)
+        # Nodes are saved in the graph's node order, so they can be matched back up without parsing labels
+        return {node: tuple(position) for node, position in zip(graph.nodes(), saved)}
+
+    layout = nx.spring_layout(drawable(graph), seed=seed)
+    # Written atomically, so a process reading the cache never sees a half written layout
+    os.makedirs(cache_dir, exist_ok=True)
+    with atomic_file(path) as file:
+        json.dump([[float(x), float(y)] for x, y in (layout[node] for node in graph.nodes())], file)
+    return layout
+
+# The positions of the players and flags after a turn, which is all the renderer needs to draw it
+Snapshot = namedtuple("Snapshot", ["turn_count", "red", "blue", "red_flag", "blue_flag", "last_move"])
+
+def snapshot(state):
+    """Copy the parts of the game state that are drawn, so it can be drawn later or on another thread"""
+    return Snapshot(state.turn_count, tuple(player.position for player in state.red), tuple(player.position for player in state.blue),
+                    state.red_flag.position, state.blue_flag.position, state.last_move)
+
+class GameRenderer:
+    """Draws the graph once, then only updates the colours of nodes whose players or flags have changed"""
+    NODE_COLOUR = "#1f78b4"   # The networkx default
+
+    def __init__(self, graph, pos=None, headless=False):
+        graph = drawable(graph)
+        self.graph = graph
+        self.pos = pos if pos is not None else cached_layout(graph)
+        self.nodes = list(graph.nodes())
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        if headless:
+            # Draw straight onto an image, without pyplot or a window
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.figure = Figure()
+            FigureCanvasAgg(self.figure)
+        else:
+            self.figure = pyplot().figure()
+        self.axes = self.figure.add_subplot()
+        self.axes.set_axis_off()
+
+        # The static part of the graph is only drawn once
+        nx.draw_networkx_edges(graph, self.pos, ax=self.axes)
+        nx.draw_networkx_labels(graph, self.pos, ax=self.axes)
+        self.face_colours = [self.NODE_COLOUR] * len(self.nodes)
+        self.edge_colours = [self.NODE_COLOUR] * len(self.nodes)
+        self.line_widths = [1.0] * len(self.nodes)
+        self.node_collection = nx.draw_networkx_nodes(graph, self.pos, ax=self.axes, nodelist=self.nodes, node_color=self.face_colours)
+        self.node_collection.set_zorder(2)
+        # The last move is highlighted by a single extra line
+        from matplotlib.collections import LineCollection
+        self.move_highlight = LineCollection([], colors="orange", linewidths=4, zorder=1)
+        self.axes.add_collection(self.move_highlight)
+        self.previous = None
+
+    def node_style(self, node, current):
+        """Return the (face colour, edge colour, line width) of a node in a snapshot"""
+        face_colour = self.NODE_COLOUR
+        if node in current.red:
+            face_colour = "pink"
+        if node in current.blue:
+            face_colour = "cyan"
+        if node == current.red_flag:
+            return face_colour, "red", 4.0
+        if node == current.blue_flag:
+            return face_colour, "blue", 4.0
+        return face_colour, face_colour, 1.0
+
+    def update(self, current):
+        """Update the drawing to show a snapshot, only restyling the nodes that have changed"""
+        changed = set(current.red) | set(current.blue) | {current.red_flag, current.blue_flag}
+        if self.previous is not None:
+            changed |= set(self.previous.red) | set(self.previous.blue) | {self.previous.red_flag, self.previous.blue_flag}
+        for node in changed:
+            i = self.index[node]
+            self.face_colours[i], self.edge_colours[i], self.line_widths[i] = self.node_style(node, current)
+        self.node_collection.set_facecolors(self.face_colours)
+        self.node_collection.set_edgecolors(self.edge_colours)
+        self.node_collection.set_linewidths(self.line_widths)
+        if current.last_move is not None:
+            start, end = current.last_move
+            self.move_highlight.set_segments([[self.pos[start], self.pos[end]]])
+        self.axes.set_title(f"Turn {current.turn_count}")
+        self.previous = current
+
+    def show(self):
+        """Redraw the window without blocking the game"""
+        self.figure.canvas.draw_idle()
+        self.figure.canvas.flush_events()
+
+class FrameRecorder:
+    """Saves each drawn frame, either as numbered PNG files in a directory or as a .gif/.mp4 animation"""
+    def __init__(self, figure, output, fps=5):
+        self.figure = figure
+        self.output = output
+        self.frame = 0
+        self.writer = None
+        if output.endswith(".gif") or output.endswith(".mp4"):
+            from matplotlib import animation
+            self.writer = animation.PillowWriter(fps=fps) if output.endswith(".gif") else animation.FFMpegWriter(fps=fps)
+            self.writer.setup(figure, output)
+        else:
+            os.makedirs(output, exist_ok=True)
+
+    def grab(self):
+        """Save the current frame"""
+        if self.writer is not None:
+            self.writer.grab_frame()
+        else:
+            self.figure.savefig(os.path.join(self.output, f"frame_{self.frame:05d}.png"))
+        self.frame += 1
+
+    def finish(self):
+        """Finish writing the animation file"""
+        if self.writer is not None:
+            self.writer.finish()
+
+class RenderWorker(threading.Thread):
+    """Draws and records snapshots on a background thread, so the game never waits for rendering.
+    This uses a headless renderer, since GUI windows can only be updated from the main thread."""
+    def __init__(self, graph, output, pos=None, fps=5):
+        super().__init__(daemon=True)
+        self.renderer = GameRenderer(graph, pos, headless=True)
+        self.recorder = FrameRecorder(self.renderer.figure, output, fps)
+        self.snapshots = queue.Queue()
+
+    def submit(self, current):
+        """Queue a snapshot to be drawn"""
+        self.snapshots.put(current)
+
+    def run(self):
+        """Draw snapshots until the game is finished"""
+        while True:
+            current = self.snapshots.get()
+            if current is None:
+                break
+            self.renderer.update(current)
+            self.recorder.grab()
+        self.recorder.finish()
+
+    def close(self):
+        """Wait for the queued snapshots to be drawn and the recording to be finished"""
+        self.snapshots.put(None)
+        self.join()
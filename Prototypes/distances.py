@@ -0,0 +1,487 @@
+# FILE:         distances.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Distance oracles used by the heuristics in place of repeated calls to nx.shortest_path.
+#               The oracle keeps a BFS from every target it is asked about (built the first time, so setting up a game
+#               costs nothing), storing the distance and the next step towards each target, so that every distance
+#               query becomes a table lookup.
+#               Paths break ties between equally short routes the way nx.shortest_path does (its bidirectional BFS),
+#               so the heuristics move exactly as they did when they called it; each first step is remembered.
+#               For graphs too big for an all-pairs table, the field cache only keeps BFS results for the current targets.
+#               Beyond that (multi-million node boards, where even one BFS is slow), the distance service answers each
+#               query with a bidirectional search guided by landmark lower bounds, keeping the paths it finds. Its
+#               ties are broken by that search instead, so games on these boards can differ from nx.shortest_path's.
+
+from array import array
+from collections import deque, OrderedDict
+import heapq
+import networkx as nx
+from board import Board
+import profiling
+
+# Most first steps remembered before starting again
+HOP_CACHE_SIZE = 2**18
+
+class BreadthFirstDistances:
+    """Shared code for the oracles, which answer queries from BFS 'fields' rooted at each target node"""
+    def __init__(self, graph):
+        if isinstance(graph, Board):
+            # Boards are already indexed by integers with compact adjacency, so use them as they are
+            self.nodes = graph.nodes()
+            self.index = self.nodes
+            self.adjacency = graph
+        else:
+            self.nodes = list(graph.nodes())
+            self.index = {node: i for i, node in enumerate(self.nodes)}
+            # Store the neighbours of each node by index so the BFS doesn't go through networkx
+            self.adjacency = [[self.index[neighbour] for neighbour in graph.neighbors(node)] for node in self.nodes]
+        # Use 2 byte entries unless the graph is too big to be indexed by them
+        self.typecode = "H" if len(self.nodes) < 0xFFFF else "I"
+        self.unreachable = 0xFFFF if self.typecode == "H" else 0xFFFFFFFF
+        self.hops = {}  # (source, target) index -> next node index on the path nx.shortest_path would take
+
+    def bfs(self, target):
+        """Run a BFS out from the target, recording each node's distance and its parent (the next step towards the target)"""
+        size = len(self.nodes)
+        # Work on plain lists while searching, then pack them into compact arrays
+        distance = [self.unreachable] * size
+        next_step = [self.unreachable] * size
+        distance[target] = 0
+        next_step[target] = target
+        queue = deque([target])
+        while queue:
+            node = queue.popleft()
+            for neighbour in self.adjacency[node]:
+                if distance[neighbour] == self.unreachable:
+                    distance[neighbour] = distance[node] + 1
+                    next_step[neighbour] = node  # Walking back to the parent moves one step closer to the target
+                    queue.append(neighbour)
+        return array(self.typecode, distance), array(self.typecode, next_step)
+
+    def field(self, target):
+        """Return the (distance, next_step) arrays for a target index. The subclasses keep them; here, a BFS is run
+        every time, which suits one-off searches"""
+        return self.bfs(target)
+
+    def bidirectional_path(self, source, target):
+        """Return the shortest path between two node indices found the same way as nx.shortest_path: BFS levels from
+        each end, always growing the smaller fringe, until they meet. Equally short paths are chosen between the same
+        way, which the tables' BFS from the target alone wouldn't do"""
+        if source == target:
+            return [source]
+        adjacency = self.adjacency
+        pred = {source: None}
+        succ = {target: None}
+        forward_fringe = [source]
+        reverse_fringe = [target]
+        meeting = None
+        while forward_fringe and reverse_fringe and meeting is None:
+            if len(forward_fringe) <= len(reverse_fringe):
+                this_level = forward_fringe
+                forward_fringe = []
+                for node in this_level:
+                    for neighbour in adjacency[node]:
+                        if neighbour not in pred:
+                            forward_fringe.append(neighbour)
+                            pred[neighbour] = node
+                        if neighbour in succ:
+                            meeting = neighbour
+                            break
+                    if meeting is not None:
+                        break
+            else:
+                this_level = reverse_fringe
+                reverse_fringe = []
+                for node in this_level:
+                    for neighbour in adjacency[node]:
+                        if neighbour not in succ:
+                            succ[neighbour] = node
+                            reverse_fringe.append(neighbour)
+                        if neighbour in pred:
+                            meeting = neighbour
+                            break
+                    if meeting is not None:
+                        break
+        if meeting is None:
+            raise nx.NetworkXNoPath(f"No path between {self.nodes[source]} and {self.nodes[target]}.")
+        # Join the two halves at the node where they met
+        path = []
+        node = meeting
+        while node is not None:
+            path.append(node)
+            node = pred[node]
+        path.reverse()
+        node = succ[meeting]
+        while node is not None:
+            path.append(node)
+            node = succ[node]
+        return path
+
+    def distance(self, source, target):
+        """Return the number of edges on the shortest path from source to target"""
+        if profiling.metrics is not None:
+            profiling.metrics.count("distance_queries")
+        distance = self.field(self.index[target])[0][self.index[source]]
+        if distance == self.unreachable:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return distance
+
+    def path_length(self, source, target):
+        """Return the number of nodes on the shortest path, matching len(nx.shortest_path(...))"""
+        return self.distance(source, target) + 1
+
+    def next_hop(self, source, target):
+        """Return the next node on the shortest path from source to target (the one nx.shortest_path would take)"""
+        key = (self.index[source], self.index[target])
+        hop = self.hops.get(key)
+        if hop is None:
+            if len(self.hops) >= HOP_CACHE_SIZE:
+                self.hops.clear()   # Start again rather than grow without limit on big boards
+            path = self.bidirectional_path(*key)
+            hop = self.hops[key] = path[1] if len(path) > 1 else path[0]
+        return self.nodes[hop]
+
+    def first_step(self, source, target):
+        """Return the start of the shortest path from source to target: [source, next node], or just [source] if it is
+        the target. The heuristics only ever take the first step of a path, so this saves building the rest of it."""
+        if source == target:
+            return [source]
+        return [source, self.next_hop(source, target)]
+
+    def min_distance(self, sources, target):
+        """Return the shortest distance from any of the sources to the target"""
+        return min(self.distance(source, target) for source in sources)
+
+    def path(self, source, target):
+        """Return the full shortest path from source to target, the same as nx.shortest_path"""
+        return [self.nodes[node] for node in self.bidirectional_path(self.index[source], self.index[target])]
+
+class DistanceOracle(BreadthFirstDistances):
+    """All-pairs distances and next steps. Each target's row is built the first time it is needed, and kept"""
+    def __init__(self, graph):
+        super().__init__(graph)
+        # distance[t][u] is the number of edges from u to t, next_step[t][u] is the first node on that path
+        self.distance_rows = [None] * len(self.nodes)
+        self.next_step_rows = [None] * len(self.nodes)
+
+    def field(self, target):
+        """Return the (distance, next_step) arrays for a target index"""
+        distance = self.distance_rows[target]
+        if distance is None:
+            distance, self.next_step_rows[target] = self.bfs(target)
+            self.distance_rows[target] = distance
+        return distance, self.next_step_rows[target]
+
+    def complete(self):
+        """Build every row that hasn't been built yet"""
+        for target in range(len(self.nodes)):
+            self.field(target)
+
+    @property
+    def distance_table(self):
+        """The whole distance table, for code that reads it directly"""
+        self.complete()
+        return self.distance_rows
+
+    @property
+    def next_step_table(self):
+        """The whole next step table, for code that reads it directly"""
+        self.complete()
+        return self.next_step_rows
+
+class DistanceFieldCache(BreadthFirstDistances):
+    """Distances to recently used targets only, for graphs too big for an all-pairs table.
+    Only a few nodes are ever targets (the bases, the flags and their carriers), so one BFS per target is kept,
+    and the least recently used fields are dropped once there are more than capacity of them.
+    When a target moves (e.g. a carried flag), the new node gets its own field and the old one ages out."""
+    def __init__(self, graph, capacity=16):
+        super().__init__(graph)
+        self.capacity = capacity
+        self.fields = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def field(self, target):
+        """Return the (distance, next_step) arrays for a target index, running a BFS if it isn't cached"""
+        field = self.fields.get(target)
+        if field is not None:
+            self.hits += 1
+            self.fields.move_to_end(target)
+            return field
+        self.misses += 1
+        field = self.bfs(target)
+        self.fields[target] = field
+        # Drop the least recently used field if there are too many
+        if len(self.fields) > self.capacity:
+            self.fields.popitem(last=False)
+        return field
+
+# Rough size of one node's entry in a partial tree (a dict slot and a tuple of two ints)
+ENTRY_BYTES = 160
+
+class TargetTree:
+    """The shortest path tree to one target: the paths found by searches so far, or the full BFS once it is built"""
+    def __init__(self):
+        self.entries = {}       # node -> (distance to the target, next step towards it), for a partial tree
+        self.field = None       # (distance, next_step) arrays, once the full BFS has been run
+        self.work = 0           # Nodes visited by searches towards the target, to decide when a BFS would be cheaper
+
+    def lookup(self, node):
+        """Return the (distance, next step) of a node, or None if it isn't known yet"""
+        if self.field is not None:
+            return self.field[0][node], self.field[1][node]
+        return self.entries.get(node)
+
+    def memory_bytes(self):
+        """Return roughly how much memory the tree uses"""
+        if self.field is not None:
+            return sum(part.itemsize * len(part) for part in self.field)
+        return ENTRY_BYTES * len(self.entries)
+
+class DistanceService(BreadthFirstDistances):
+    """Distances for boards too big to run a BFS for every target (hundreds of thousands of nodes and more).
+    A few landmark nodes, spread out across the board, give lower bounds: d(u, v) >= |d(l, u) - d(l, v)| for any
+    landmark l. Exact queries run a bidirectional search between the two nodes, guided towards each other by these
+    bounds (ALT), which usually only visits the nodes near the shortest path; with no landmarks it is a plain
+    bidirectional BFS. Each path found is kept in the tree of shortest paths to its target, so players walking along
+    it (or searching onto it) are answered from the tree. Once the searches towards a target have visited as many
+    nodes as a BFS would, the full BFS tree is built instead. The trees are dropped in least recently used order to
+    stay within memory_limit bytes."""
+    def __init__(self, graph, landmarks=8, memory_limit=256 * 2**20):
+        super().__init__(graph)
+        self.memory_limit = memory_limit
+        self.trees = OrderedDict()  # Target index -> TargetTree
+        self.memory = 0
+        self.searches = 0
+        self.visited = 0
+        self.hits = 0
+        self.landmarks = []
+        self.landmark_distances = []
+        self.choose_landmarks(landmarks)
+
+    def choose_landmarks(self, count):
+        """Pick landmarks that are far from each other (each the node furthest from those picked so far)"""
+        if len(self.nodes) == 0 or count == 0:
+            return
+        # Start from the node furthest from an arbitrary node, which is on the edge of the board
+        distance = self.bfs(0)[0]
+        closest = None
+        for landmark in range(count):
+            furthest = distance if closest is None else closest
+            node = furthest.index(max(furthest))
+            if closest is not None and closest[node] == 0:
+                break   # Every node is already a landmark
+            distance = self.bfs(node)[0]
+            self.landmarks.append(node)
+            self.landmark_distances.append(distance)
+            closest = list(distance) if closest is None else list(map(min, closest, distance))
+
+    def bound(self, source, target):
+        """Return the landmark lower bound on the distance between two node indices (inf if they aren't connected)"""
+        unreachable = self.unreachable
+        best = 0
+        for distance in self.landmark_distances:
+            a = distance[source]
+            b = distance[target]
+            if a == unreachable or b == unreachable:
+                if a != b:
+                    return float("inf")   # Only one of them can reach the landmark
+                continue
+            gap = a - b if a > b else b - a
+            if gap > best:
+                best = gap
+        return best
+
+    def lower_bound(self, source, target):
+        """Return a lower bound on the distance from source to target, without searching"""
+        return self.bound(self.index[source], self.index[target])
+
+    def tree(self, target):
+        """Return the tree for a target index, most recently used first"""
+        tree = self.trees.get(target)
+        if tree is None:
+            tree = TargetTree()
+            self.trees[target] = tree
+        else:
+            self.trees.move_to_end(target)
+        return tree
+
+    def lookup(self, source, target):
+        """Return the (distance, next step) from a source index towards a target index, searching if it isn't known"""
+        tree = self.tree(target)
+        entry = tree.lookup(source)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.search(source, target, tree)
+        return tree.lookup(source)
+
+    def search(self, source, target, tree):
+        """Find a shortest path with a bidirectional search and add it to the target's tree.
+        Each side is a Dijkstra search on edge lengths reduced by the potential (pi_t(v) - pi_s(v)) / 2, where pi_t and
+        pi_s are the landmark bounds to the target and from the source. The reduced lengths are never negative, so the
+        usual bidirectional stopping rule holds, and they are doubled here to keep them as integers."""
+        if self.bound(source, target) == float("inf"):
+            raise nx.NetworkXNoPath(f"No path between {self.nodes[source]} and {self.nodes[target]}.")
+        if source == target:
+            self.record(target, tree, [target], 0)
+            return
+        adjacency = self.adjacency
+        bound = self.bound
+        known = tree.entries
+        potentials = {}
+
+        def potential(node):
+            value = potentials.get(node)
+            if value is None:
+                value = potentials[node] = bound(node, target) - bound(source, node)
+            return value
+
+        forward = {source: 0}       # Reduced (doubled) distances from the source
+        backward = {target: 0}      # Reduced (doubled) distances to the target
+        forward_parent = {source: None}
+        backward_parent = {target: None}
+        forward_heap = [(0, source)]
+        backward_heap = [(0, target)]
+        best = float("inf")         # Reduced length of the shortest path found so far
+        meeting = None              # (node, whether the rest of the path comes from the tree)
+        target_potential = potential(target)
+        visited = 0
+        while forward_heap and backward_heap:
+            if forward_heap[0][0] + backward_heap[0][0] >= best:
+                break   # Neither search can find a shorter path
+            # Expand the side with the smaller frontier
+            if len(forward_heap) <= len(backward_heap):
+                key, node = heapq.heappop(forward_heap)
+                if key > forward[node]:
+                    continue
+                visited += 1
+                # A node already in the tree has a known shortest path on to the target
+                entry = known.get(node)
+                if entry is not None:
+                    length = key + 2 * entry[0] - potential(node) + target_potential
+                    if length < best:
+                        best = length
+                        meeting = (node, True)
+                node_potential = potential(node)
+                for neighbour in adjacency[node]:
+                    length = key + 2 - node_potential + potential(neighbour)
+                    if length < forward.get(neighbour, float("inf")):
+                        forward[neighbour] = length
+                        forward_parent[neighbour] = node
+                        heapq.heappush(forward_heap, (length, neighbour))
+                        if neighbour in backward and length + backward[neighbour] < best:
+                            best = length + backward[neighbour]
+                            meeting = (neighbour, False)
+            else:
+                key, node = heapq.heappop(backward_heap)
+                if key > backward[node]:
+                    continue
+                visited += 1
+                node_potential = potential(node)
+                for neighbour in adjacency[node]:
+                    # Walking backwards, the edge goes from the neighbour to the node
+                    length = key + 2 - potential(neighbour) + node_potential
+                    if length < backward.get(neighbour, float("inf")):
+                        backward[neighbour] = length
+                        backward_parent[neighbour] = node
+                        heapq.heappush(backward_heap, (length, neighbour))
+                        if neighbour in forward and length + forward[neighbour] < best:
+                            best = length + forward[neighbour]
+                            meeting = (neighbour, False)
+        self.searches += 1
+        self.visited += visited
+        if meeting is None:
+            raise nx.NetworkXNoPath(f"No path between {self.nodes[source]} and {self.nodes[target]}.")
+
+        # Join the two halves of the path at the meeting node
+        node, from_tree = meeting
+        path = []
+        while node is not None:
+            path.append(node)
+            node = forward_parent[node]
+        path.reverse()
+        node = path[-1]
+        if from_tree:
+            while node != target:
+                node = known[node][1]
+                path.append(node)
+        else:
+            node = backward_parent[node]
+            while node is not None:
+                path.append(node)
+                node = backward_parent[node]
+        self.record(target, tree, path, visited)
+
+    def record(self, target, tree, path, visited):
+        """Add a path to a target's tree, then build the full tree if it would now be cheaper, and trim the cache"""
+        before = tree.memory_bytes()
+        if tree.field is None:
+            last = len(path) - 1
+            for position, node in enumerate(path):
+                if node not in tree.entries:
+                    tree.entries[node] = (last - position, path[position + 1] if position < last else node)
+            tree.work += visited
+            if tree.work >= len(self.nodes):
+                tree.field = self.bfs(target)
+                tree.entries = {}
+        self.memory += tree.memory_bytes() - before
+        # Drop the least recently used trees, but never the one just used
+        while self.memory > self.memory_limit and len(self.trees) > 1:
+            dropped_target, dropped = self.trees.popitem(last=False)
+            self.memory -= dropped.memory_bytes()
+
+    def field(self, target):
+        """Return the (distance, next_step) arrays for a target index, building the full tree if it isn't already"""
+        tree = self.tree(target)
+        if tree.field is None:
+            tree.work = len(self.nodes)
+            self.record(target, tree, [target], 0)
+        return tree.field
+
+    def distance(self, source, target):
+        """Return the number of edges on the shortest path from source to target"""
+        if profiling.metrics is not None:
+            profiling.metrics.count("distance_queries")
+        distance = self.lookup(self.index[source], self.index[target])[0]
+        if distance == self.unreachable:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return distance
+
+    def next_hop(self, source, target):
+        """Return the next node on the shortest path from source to target"""
+        self.distance(source, target)   # Raise an error if the target can't be reached
+        return self.nodes[self.lookup(self.index[source], self.index[target])[1]]
+
+    def min_distance(self, sources, target):
+        """Return the shortest distance from any of the sources to the target, only searching from the sources
+        whose lower bound is less than the shortest distance found so far"""
+        goal = self.index[target]
+        bounds = sorted((self.bound(self.index[source], goal), source) for source in sources)
+        best = float("inf")
+        for bound, source in bounds:
+            if bound >= best:
+                break
+            best = min(best, self.distance(source, target))
+        return best
+
+    def path(self, source, target):
+        """Return the full shortest path from source to target, in the same form as nx.shortest_path"""
+        self.distance(source, target)   # Raise an error if the target can't be reached
+        goal = self.index[target]
+        current = self.index[source]
+        path = [source]
+        # Every node on a path found by a search is in the tree, so the next steps lead all the way to the target
+        while current != goal:
+            current = self.lookup(current, goal)[1]
+            path.append(self.nodes[current])
+        return path
+
+def make_distances(graph, all_pairs_limit=5000, field_limit=100000):
+    """Use the all-pairs oracle on small graphs, the per-target cache on graphs too big for it, and the distance
+    service on graphs where even one BFS per target is too slow"""
+    if graph.number_of_nodes() <= all_pairs_limit:
+        return DistanceOracle(graph)
+    if graph.number_of_nodes() <= field_limit:
+        return DistanceFieldCache(graph)
+    return DistanceService(graph)
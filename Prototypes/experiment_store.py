@@ -0,0 +1,123 @@
+# FILE:         experiment_store.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  A SQLite database of game results, written as the games finish so long experiments can be resumed.
+#               Each game is keyed by (graph id, team size, agent config, seed): the graph id is the board's catalogue
+#               hash, and the agent config is a JSON string of every other setting that changes the game (the agents,
+#               base placement, turn limit and master seed). A rerun looks up which keys are already done and only
+#               plays the rest, so a crashed or pre-empted tournament picks up where it left off.
+#               The database is in write-ahead log mode, so the summary can be read while a tournament is writing.
+#               Results are committed in batches, so at most one batch is lost (and replayed) if the job is killed.
+
+import argparse
+import importlib
+import json
+import sqlite3
+import time
+
+game = importlib.import_module("Prototype3-Teams")
+
+EXPERIMENTS = "experiments.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    graph_id TEXT NOT NULL,
+    team_size INTEGER NOT NULL,
+    agent_config TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    family TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    placement TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    turns INTEGER NOT NULL,
+    captures INTEGER NOT NULL,
+    resets INTEGER NOT NULL,
+    repetitions INTEGER NOT NULL,
+    draw_reason TEXT,
+    seconds REAL NOT NULL,
+    finished REAL NOT NULL,
+    PRIMARY KEY (graph_id, team_size, agent_config, seed)
+) WITHOUT ROWID;
+-- Covers the summary, so it is answered from the index without reading the table
+CREATE INDEX IF NOT EXISTS results_summary
+    ON results (family, size, team_size, placement, agent_config, winner, turns, draw_reason, repetitions);
+"""
+
+def agent_config(**settings):
+    """Return the agent config key for a set of settings, the same whatever order they are given in"""
+    return json.dumps(settings, sort_keys=True, separators=(",", ":"))
+
+class ExperimentStore:
+    """Game results saved in a SQLite database, keyed by (graph_id, team_size, agent_config, seed)"""
+    def __init__(self, path=EXPERIMENTS, batch_size=64, batch_seconds=5.0):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")   # Safe with WAL: a crash can only lose the last commits
+        self.connection.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.pending = []
+        self.last_commit = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def record(self, graph_id, team_size, config, seed, family, size, placement, result, seconds):
+        """Save the result of a game, committing once enough results (or time) have built up"""
+        self.pending.append((graph_id, team_size, config, seed, family, size, placement, result.winner, result.turns,
+                             result.captures, result.resets, result.repetitions, result.draw_reason, seconds, time.time()))
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.last_commit >= self.batch_seconds:
+            self.flush()
+
+    def flush(self):
+        """Commit the results waiting to be saved"""
+        if self.pending:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                            self.pending)
+            self.pending = []
+        self.last_commit = time.monotonic()
+
+    def results(self, graph_id, team_size, config):
+        """Return {seed: GameResult} for the games played with a graph, team size and agent config"""
+        rows = self.connection.execute("SELECT seed, winner, turns, captures, resets, repetitions, draw_reason FROM results "
+                                       "WHERE graph_id = ? AND team_size = ? AND agent_config = ?",
+                                       (graph_id, team_size, config))
+        return {seed: game.GameResult(*fields) for seed, *fields in rows}
+
+    def summary(self):
+        """Return the win, draw and game length totals for every configuration in the store"""
+        rows = self.connection.execute("""
+            SELECT family, size, team_size, placement, agent_config, COUNT(*),
+                   SUM(winner = 'Red'), SUM(winner = 'Blue'), SUM(winner = 'Draw'), SUM(draw_reason IS 'repetition'),
+                   AVG(CASE WHEN winner != 'Draw' THEN turns END), AVG(repetitions)
+            FROM results GROUP BY family, size, team_size, placement, agent_config
+            ORDER BY family, size, team_size, placement, agent_config""")
+        columns = ["family", "size", "team_size", "placement", "agent_config", "games", "red_wins", "blue_wins", "draws",
+                   "repetition_draws", "length", "repetitions"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        """Commit anything left and close the database"""
+        self.flush()
+        self.connection.close()
+
+def main():
+    """Print the summary of the results in a store"""
+    parser = argparse.ArgumentParser(description="Summarise the Prototype3 game results saved by tournaments.")
+    parser.add_argument("path", nargs="?", default=EXPERIMENTS)
+    args = parser.parse_args()
+
+    with ExperimentStore(args.path) as store:
+        print(f"{'family':<10}{'size':>6}{'team':>6}{'bases':>10}{'games':>7}{'red':>7}{'blue':>7}{'draws':>7}{'repeated':>10}{'turns':>8}  config")
+        for row in store.summary():
+            length = row["length"] if row["length"] is not None else 0.0
+            print(f"{row['family']:<10}{row['size']:>6}{row['team_size']:>6}{row['placement']:>10}{row['games']:>7}"
+                  f"{row['red_wins']:>7}{row['blue_wins']:>7}{row['draws']:>7}{row['repetition_draws']:>10}{length:>8.1f}  "
+                  f"{row['agent_config']}")
+
+if __name__ == "__main__":
+    main()
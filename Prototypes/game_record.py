@@ -0,0 +1,202 @@
+# FILE:         game_record.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Save every turn of a Prototype3 game to a compact binary file, and replay it later.
+#               The file starts with a header (graph fingerprint, seed, bases, starting positions), followed by one
+#               fixed width record per turn, so turn k can be found by seeking straight to it.
+#               Every few turns a snapshot of the whole state is written to a '.snap' file alongside, so the state
+#               at any turn can be rebuilt from the nearest snapshot instead of replaying the whole game.
+
+import argparse
+import importlib
+import struct
+from compact_state import NO_PLAYER
+import display
+from distances import make_distances
+
+game = importlib.import_module("Prototype3-Teams")
+
+MAGIC = b"CTFR"
+VERSION = 1
+# magic, version, players per team, graph fingerprint, seed, red base, blue base, snapshot interval
+HEADER = struct.Struct("<4sHH32sQIII")
+# turn, team, player, from node, to node, events
+TURN = struct.Struct("<IBHIIB")
+
+# Event flags stored with each turn
+PICKUP = 1
+RESET = 2
+CAPTURE = 4
+DRAW_REPETITION = 8
+DRAW_TURN_LIMIT = 16
+
+# How each draw is recorded, as the replay doesn't have the position history the repetitions were counted from
+DRAW_EVENTS = {"repetition": DRAW_REPETITION, "turn limit": DRAW_TURN_LIMIT}
+
+def graph_fingerprint(graph):
+    """Return the 32 byte hash of the graph used for the layout cache, to check a record is replayed on the right graph"""
+    return bytes.fromhex(display.graph_hash(graph))
+
+def snapshot_struct(team_size):
+    """Snapshots hold the turn, capture and reset counts, the two flag carriers and every player's position"""
+    return struct.Struct(f"<III2i{2 * team_size}I")
+
+class GameRecorder:
+    """Streams a game to disk. Can be passed to run_game as its observer."""
+    def __init__(self, path, graph, seed=None, snapshot_interval=64):
+        self.path = path
+        self.fingerprint = graph_fingerprint(graph)
+        self.seed = 0 if seed is None else seed & 0xFFFFFFFFFFFFFFFF
+        self.snapshot_interval = snapshot_interval
+
+    def start(self, state):
+        """Write the header and the first snapshot"""
+        self.players = state.red + state.blue
+        self.player_index = {id(player): i for i, player in enumerate(self.players)}
+        self.snapshot = snapshot_struct(len(state.red))
+        self.captures = state.captures
+        self.resets = state.resets
+        self.file = open(self.path, "wb")
+        self.snapshot_file = open(self.path + ".snap", "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(state.red), self.fingerprint, self.seed,
+                                    state.red_base, state.blue_base, self.snapshot_interval))
+        self.file.write(struct.pack(f"<{len(self.players)}I", *(player.position for player in self.players)))
+        self.write_snapshot(state)
+
+    def write_snapshot(self, state):
+        """Write the full state, so replays can start from here"""
+        carriers = [NO_PLAYER if flag.carried_by is None else self.player_index[id(flag.carried_by)]
+                    for flag in (state.red_flag, state.blue_flag)]
+        self.snapshot_file.write(self.snapshot.pack(state.turn_count, state.captures, state.resets, *carriers,
+                                                    *(player.position for player in self.players)))
+
+    def turn(self, state, player):
+        """Write the turn that has just been played"""
+        events = 0
+        if state.captures > self.captures:
+            events |= PICKUP
+        if state.resets > self.resets:
+            events |= RESET
+        if state.winner in ("Red", "Blue"):
+            events |= CAPTURE
+        elif state.winner == "Draw":
+            events |= DRAW_EVENTS[state.draw_reason]
+        self.captures = state.captures
+        self.resets = state.resets
+        start, end = state.last_move
+        team = 0 if player.team == "red" else 1
+        self.file.write(TURN.pack(state.turn_count - 1, team, self.player_index[id(player)], start, end, events))
+        if state.turn_count % self.snapshot_interval == 0:
+            self.write_snapshot(state)
+
+    def finish(self, state):
+        """Close the files"""
+        self.file.close()
+        self.snapshot_file.close()
+
+class GameReader:
+    """Reads a recorded game and rebuilds its state at any turn"""
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.snapshot_file = open(path + ".snap", "rb")
+        magic, version, self.team_size, self.fingerprint, self.seed, self.red_base, self.blue_base, self.snapshot_interval = \
+            HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} game record")
+        self.start_positions = struct.unpack(f"<{2 * self.team_size}I", self.file.read(8 * self.team_size))
+        self.turns_offset = HEADER.size + 8 * self.team_size
+        self.snapshot = snapshot_struct(self.team_size)
+        self.checked_graph = None   # The last graph matched against the fingerprint, so it is only hashed once
+        self.distances = None       # Distances for checked_graph, shared by every state rebuilt on it
+
+    def __len__(self):
+        """Return the number of turns recorded"""
+        self.file.seek(0, 2)
+        return (self.file.tell() - self.turns_offset) // TURN.size
+
+    def turn(self, k):
+        """Return turn k as (turn, team, player, from node, to node, events)"""
+        self.file.seek(self.turns_offset + k * TURN.size)
+        return TURN.unpack(self.file.read(TURN.size))
+
+    def turns(self, start=0, stop=None):
+        """Read the turns from start up to (not including) stop"""
+        stop = len(self) if stop is None else stop
+        self.file.seek(self.turns_offset + start * TURN.size)
+        data = self.file.read((stop - start) * TURN.size)
+        return list(TURN.iter_unpack(data))
+
+    def state_at(self, k, graph, distances=None):
+        """Rebuild the GameState after k turns, starting from the nearest snapshot before it"""
+        if graph is not self.checked_graph:
+            if graph_fingerprint(graph) != self.fingerprint:
+                raise ValueError("The game was recorded on a different graph")
+            self.checked_graph = graph
+            self.distances = make_distances(graph)
+        distances = self.distances if distances is None else distances
+        # Snapshots are written every snapshot_interval turns, starting at turn 0
+        self.snapshot_file.seek(0, 2)
+        available = self.snapshot_file.tell() // self.snapshot.size
+        index = min(k // self.snapshot_interval, available - 1)
+        self.snapshot_file.seek(index * self.snapshot.size)
+        turn_count, captures, resets, red_carrier, blue_carrier, *positions = \
+            self.snapshot.unpack(self.snapshot_file.read(self.snapshot.size))
+
+        # Set up the players and flags as they were at the snapshot
+        state = game.new_game(graph, self.team_size, self.red_base, self.blue_base, distances,
+                              starts=(positions[:self.team_size], positions[self.team_size:]))
+        players = state.red + state.blue
+        for flag, carrier in ((state.red_flag, red_carrier), (state.blue_flag, blue_carrier)):
+            if carrier != NO_PLAYER:
+                flag.pick_up(players[carrier])
+                flag.position = players[carrier].position
+        state.turn = "red" if turn_count % 2 == 0 else "blue"
+        state.turn_count = turn_count
+        state.captures = captures
+        state.resets = resets
+        state.check_win()   # The snapshot may have been taken on the winning turn
+        # Draws are taken from the record instead, since the repetitions before the snapshot aren't known here
+        state.repetition_limit = None
+
+        # Replay the turns since the snapshot, letting the game rules pick up and reset the flags
+        for turn, team, player, start, end, events in self.turns(turn_count, k):
+            state.move_player(players[player], end)
+        if k > 0 and state.winner is None:
+            events = self.turn(k - 1)[5]
+            for reason, flag in DRAW_EVENTS.items():
+                if events & flag:
+                    state.winner = "Draw"
+                    state.draw_reason = reason
+        return state
+
+    def close(self):
+        """Close the files"""
+        self.file.close()
+        self.snapshot_file.close()
+
+def main():
+    """Record a game on the default board, or show a turn of a recorded game"""
+    parser = argparse.ArgumentParser(description="Record and replay Prototype3 games.")
+    parser.add_argument("command", choices=["record", "show"])
+    parser.add_argument("path")
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--turn", type=int, default=None, help="turn to show (defaults to the end of the game)")
+    args = parser.parse_args()
+
+    graph = game.build_graph()
+    if args.command == "record":
+        result = game.run_game(graph, args.players, seed=args.seed, max_turns=args.max_turns,
+                               observer=GameRecorder(args.path, graph, args.seed))
+        print(result)
+    else:
+        reader = GameReader(args.path)
+        turn = len(reader) if args.turn is None else args.turn
+        state = reader.state_at(turn, graph)
+        print(f"Turn {turn}: red {[player.position for player in state.red]}, blue {[player.position for player in state.blue]}, "
+              f"red flag {state.red_flag.position}, blue flag {state.blue_flag.position}, winner {state.winner}")
+        reader.close()
+
+if __name__ == "__main__":
+    main()
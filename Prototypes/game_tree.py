@@ -0,0 +1,323 @@
+# FILE:         game_tree.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  A game tree search agent for the Prototype3 game.
+#               Uses minimax (in negamax form) with alpha-beta pruning and iterative deepening, so the deepest
+#               completed search is used when the time for the move runs out.
+#               Positions are identified by a Zobrist hash that is updated with each move, and stored in a fixed size
+#               transposition table so positions reached by different move orders are only searched once.
+
+import importlib
+import random
+import time
+from compact_state import CompactState, RED, BLUE, NO_PLAYER, adjacency_lists
+from distances import make_distances
+
+game = importlib.import_module("Prototype3-Teams")
+
+WIN_SCORE = 100000
+# Scores above this are wins/losses found by the search, rather than evaluations
+WIN_THRESHOLD = WIN_SCORE - 1000
+
+# Types of bound stored in the transposition table
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time for the move has run out"""
+
+class ZobristKeys:
+    def __init__(self, num_players, num_nodes, seed=0):
+        rng = random.Random(seed)
+        # One random 64 bit key for each player on each node, each flag carrier (or no carrier) and the turn
+        self.player_keys = [[rng.getrandbits(64) for node in range(num_nodes)] for player in range(num_players)]
+        self.carrier_keys = [[rng.getrandbits(64) for carrier in range(num_players + 1)] for flag in (RED, BLUE)]
+        self.turn_key = rng.getrandbits(64)
+
+    def hash(self, state):
+        """Calculate the hash of a state from scratch"""
+        value = 0
+        for player, node in enumerate(state.positions):
+            value ^= self.player_keys[player][node]
+        for flag in (RED, BLUE):
+            value ^= self.carrier_keys[flag][state.carriers[flag] + 1]
+        if state.turn == BLUE:
+            value ^= self.turn_key
+        return value
+
+    def update(self, value, state, record):
+        """Update a hash after state.apply_move, using the undo record it returned"""
+        player, position, red_carrier, blue_carrier, winner = record
+        value ^= self.player_keys[player][position] ^ self.player_keys[player][state.positions[player]]
+        if state.carriers[RED] != red_carrier:
+            value ^= self.carrier_keys[RED][red_carrier + 1] ^ self.carrier_keys[RED][state.carriers[RED] + 1]
+        if state.carriers[BLUE] != blue_carrier:
+            value ^= self.carrier_keys[BLUE][blue_carrier + 1] ^ self.carrier_keys[BLUE][state.carriers[BLUE] + 1]
+        return value ^ self.turn_key
+
+class TranspositionTable:
+    def __init__(self, size_bits=20):
+        # The table has a fixed number of slots, so its memory use is bounded
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.keys = [None] * self.size
+        self.depths = [0] * self.size
+        self.values = [0] * self.size
+        self.bounds = [EXACT] * self.size
+        self.moves = [None] * self.size
+        self.generations = [0] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        """Start a new search, so entries from earlier moves are replaced first"""
+        self.generation += 1
+
+    def probe(self, key):
+        """Return the slot holding the position, or None if it isn't stored"""
+        slot = key & self.mask
+        if self.keys[slot] == key:
+            return slot
+        return None
+
+    def store(self, key, depth, value, bound, move):
+        """Store a search result, replacing the existing entry if it is older or was searched less deeply"""
+        slot = key & self.mask
+        if (self.keys[slot] is None or self.keys[slot] == key or self.generations[slot] != self.generation
+                or depth >= self.depths[slot]):
+            self.keys[slot] = key
+            self.depths[slot] = depth
+            self.values[slot] = value
+            self.bounds[slot] = bound
+            self.moves[slot] = move
+            self.generations[slot] = self.generation
+
+class AlphaBetaAgent:
+    def __init__(self, graph, distances=None, max_depth=8, time_limit=1.0, table_bits=20, seed=0):
+        self.graph = graph
+        self.distances = distances if distances is not None else make_distances(graph)
+        self.adjacency = adjacency_lists(graph)
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.table = TranspositionTable(table_bits)
+        self.seed = seed
+        self.keys = None
+        self.nodes_searched = 0
+        self.depth_reached = 0
+        self.best_move = None   # The best move found by the deepest completed search, as (player index, node)
+        self.search_turn = None # The turn that best_move is for
+
+    def choose(self, state, deadline=None):
+        """Return the (player, node) move to make from a Prototype3 GameState.
+        The search stops at the deadline (a time.perf_counter() time) if one is given, otherwise after time_limit."""
+        if deadline is None:
+            deadline = time.perf_counter() + self.time_limit
+        compact = CompactState.from_game_state(state)
+        if self.keys is None:
+            self.keys = ZobristKeys(len(compact.positions), len(self.adjacency), self.seed)
+        players = state.red + state.blue
+        self.best_move = None
+        self.search_turn = state.turn_count
+        player, node = self.search(compact, self.root_order(state, players), deadline)
+        return players[player], node
+
+    def best_so_far(self, state):
+        """Return the best (player, node) move from the deepest search of the state completed so far, or None.
+        A move left over from an earlier turn (if this turn's search hasn't started yet) is never returned."""
+        if self.best_move is None or self.search_turn != state.turn_count:
+            return None
+        player, node = self.best_move
+        return (state.red + state.blue)[player], node
+
+    def root_order(self, state, players):
+        """Rank the root moves using the scores from GameState.player_to_move, best first"""
+        order = {}
+        for score, player, path in state.player_scores():
+            order[(players.index(player), path[1])] = score
+        return order
+
+    def search(self, state, root_order, deadline):
+        """Run iterative deepening until the maximum depth or the deadline is reached"""
+        self.deadline = deadline
+        self.nodes_searched = 0
+        self.table.new_search()
+        key = self.keys.hash(state)
+        moves = state.legal_moves(self.adjacency)
+        # Try the moves the heuristics prefer first, then the rest by how much closer they get to a target
+        moves.sort(key=lambda move: (-root_order.get(move, float("-inf")), self.move_distance(state, move)))
+        best_move = moves[0]
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                value, move = self.search_root(state, key, depth, moves)
+            except SearchTimeout:
+                break
+            best_move = move
+            self.best_move = move
+            self.depth_reached = depth
+            # Search the best move first on the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+            # Stop early once a forced result has been found
+            if abs(value) >= WIN_THRESHOLD:
+                break
+        return best_move
+
+    def search_root(self, state, key, depth, moves):
+        """Search each move at the root and return the best value and move"""
+        alpha = -WIN_SCORE - 1
+        beta = WIN_SCORE + 1
+        best_move = moves[0]
+        for move in moves:
+            record = state.apply_move(*move)
+            value = -self.negamax(state, self.keys.update(key, state, record), depth - 1, -beta, -alpha, 1)
+            state.undo_move(record)
+            if value > alpha:
+                alpha = value
+                best_move = move
+        self.table.store(key, depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def negamax(self, state, key, depth, alpha, beta, ply):
+        """Return the value of the state for the team whose turn it is"""
+        self.nodes_searched += 1
+        # Only check the clock every so often, since it is relatively slow
+        if self.nodes_searched & 127 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        # The team that just moved has won
+        if state.winner is not None:
+            return -(WIN_SCORE - ply)
+        if depth == 0:
+            return self.evaluate(state)
+
+        # Use the stored result if this position has already been searched deeply enough
+        original_alpha = alpha
+        table_move = None
+        slot = self.table.probe(key)
+        if slot is not None:
+            table_move = self.table.moves[slot]
+            if self.table.depths[slot] >= depth:
+                value = self.from_table(self.table.values[slot], ply)
+                bound = self.table.bounds[slot]
+                if bound == EXACT:
+                    return value
+                elif bound == LOWER and value > alpha:
+                    alpha = value
+                elif bound == UPPER and value < beta:
+                    beta = value
+                if alpha >= beta:
+                    return value
+
+        best_value = -WIN_SCORE - 1
+        best_move = None
+        for move in self.ordered_moves(state, table_move):
+            record = state.apply_move(*move)
+            value = -self.negamax(state, self.keys.update(key, state, record), depth - 1, -beta, -alpha, ply + 1)
+            state.undo_move(record)
+            if value > best_value:
+                best_value = value
+                best_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break   # The opponent will avoid this position, so stop searching it
+
+        # Record what kind of bound the value is
+        if best_value <= original_alpha:
+            bound = UPPER
+        elif best_value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(key, depth, self.to_table(best_value, ply), bound, best_move)
+        return best_value
+
+    def to_table(self, value, ply):
+        """Store wins relative to the stored position, rather than the root"""
+        if value >= WIN_THRESHOLD:
+            return value + ply
+        if value <= -WIN_THRESHOLD:
+            return value - ply
+        return value
+
+    def from_table(self, value, ply):
+        """Convert a stored win back to be relative to the root"""
+        if value >= WIN_THRESHOLD:
+            return value - ply
+        if value <= -WIN_THRESHOLD:
+            return value + ply
+        return value
+
+    def target(self, state, player):
+        """Return the node a player is heading towards"""
+        team = state.teams[player]
+        enemy = 1 - team
+        if state.carriers[enemy] == player:
+            return state.bases[team]   # Carrying the flag home
+        if state.carriers[team] != NO_PLAYER:
+            return state.positions[state.carriers[team]]   # Chasing the player with the team's flag
+        return state.flag_position(enemy)
+
+    def move_distance(self, state, move):
+        """Return the distance left to the player's target after a move"""
+        player, node = move
+        return self.distances.distance(node, self.target(state, player))
+
+    def ordered_moves(self, state, table_move):
+        """Order the moves with the stored best move first, then those that get closest to their target"""
+        moves = state.legal_moves(self.adjacency)
+        moves.sort(key=lambda move: self.move_distance(state, move))
+        if table_move in moves:
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+        return moves
+
+    def remaining(self, state, team):
+        """Estimate how many moves the team needs to capture the enemy flag"""
+        enemy = 1 - team
+        home = state.bases[team]
+        carrier = state.carriers[enemy]
+        if carrier != NO_PLAYER:
+            return self.distances.distance(state.positions[carrier], home)
+        # Otherwise the closest player has to reach the enemy flag and bring it back
+        enemy_base = state.bases[enemy]
+        closest = min(self.distances.distance(state.positions[player], enemy_base)
+                      for player in range(len(state.teams)) if state.teams[player] == team)
+        return closest + self.distances.distance(enemy_base, home)
+
+    def evaluate(self, state):
+        """Score a position for the team whose turn it is, by comparing how close each team is to winning"""
+        team = state.turn
+        enemy = 1 - team
+        score = 10 * (self.remaining(state, enemy) - self.remaining(state, team))
+        # Reward players that are close to the opponent carrying the team's flag
+        carrier = state.carriers[team]
+        if carrier != NO_PLAYER:
+            chase = min(self.distances.distance(state.positions[player], state.positions[carrier])
+                        for player in range(len(state.teams)) if state.teams[player] == team)
+            score -= 5 * chase
+        carrier = state.carriers[enemy]
+        if carrier != NO_PLAYER:
+            chase = min(self.distances.distance(state.positions[player], state.positions[carrier])
+                        for player in range(len(state.teams)) if state.teams[player] == enemy)
+            score += 5 * chase
+        return score
+
+def main():
+    """Play the alpha-beta agent (red) against the heuristics (blue)"""
+    graph = game.build_graph()
+    state = game.new_game(graph, 2, seed=42)
+    agent = AlphaBetaAgent(graph, state.distances, time_limit=1.0)
+
+    while state.winner is None and state.turn_count < 200:
+        if state.turn == "red":
+            player, node = agent.choose(state)
+            state.move_player(player, node)
+            print(f"Turn {state.turn_count}: depth {agent.depth_reached}, {agent.nodes_searched} nodes")
+        else:
+            state.play_turn()
+    print("WINNER: ", state.winner)
+
+if __name__ == "__main__":
+    main()
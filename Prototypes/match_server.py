@@ -0,0 +1,323 @@
+# FILE:         match_server.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  An asyncio server that hosts many Prototype3 games at once for agents running in other processes.
+#               Agents connect over TCP or a Unix socket and can play several games over one connection.
+#               Messages are single lines of JSON. The server sends each agent the board once, then for each of its
+#               turns only the moves made since its last turn (state delta in), and the agent replies with the player
+#               and node to move to (move out).
+#               If an agent doesn't reply within the move timeout, sends an illegal move or disconnects, a random
+#               player on its team makes a random move (as in Player.random_move) and the game carries on.
+#               AgentClient keeps a copy of each game's state from the deltas and asks a policy for its moves.
+
+from collections import namedtuple
+import argparse
+import asyncio
+import importlib
+import json
+import board
+from board import Board
+from compact_state import NO_PLAYER
+from distances import make_distances
+
+game = importlib.import_module("Prototype3-Teams")
+
+# The result of one hosted game, with the names of the agents playing each team and how many of each team's moves
+# were replaced by random ones
+MatchResult = namedtuple("MatchResult", ["game", "red", "blue", "winner", "turns", "red_fallbacks", "blue_fallbacks"])
+
+def encode(message):
+    """Encode a message as a compact line of JSON"""
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+def carriers(state, players):
+    """Return the index of the player carrying each flag (red then blue), or NO_PLAYER"""
+    return [NO_PLAYER if flag.carried_by is None else players.index(flag.carried_by) for flag in (state.red_flag, state.blue_flag)]
+
+class AgentConnection:
+    """A connected agent, which can be playing several games at once"""
+    def __init__(self, reader, writer, name, capacity):
+        self.reader = reader
+        self.writer = writer
+        self.name = name
+        self.capacity = capacity
+        self.pending = {}   # game id -> (turn, future) for the moves being waited on
+        self.closed = False
+
+    def send(self, message):
+        """Queue a message to the agent"""
+        if not self.closed:
+            self.writer.write(encode(message))
+
+    async def listen(self):
+        """Pass each move the agent sends to the game waiting for it, until the agent disconnects"""
+        while True:
+            try:
+                line = await self.reader.readline()
+            except ConnectionError:
+                break
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+                turn, future = self.pending[message["game"]]
+            except (ValueError, KeyError, TypeError):
+                continue   # Ignore garbled messages and moves for games that aren't waiting on this agent
+            # Moves that arrive after their turn timed out are dropped
+            if message.get("turn") == turn and not future.done():
+                future.set_result(message)
+        self.closed = True
+        for turn, future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"{self.name} disconnected"))
+
+    async def request_move(self, game_id, message, timeout):
+        """Send a turn to the agent and wait for its move"""
+        if self.closed:
+            raise ConnectionError(f"{self.name} disconnected")
+        future = asyncio.get_running_loop().create_future()
+        self.pending[game_id] = (message["turn"], future)
+        try:
+            self.send(message)
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            del self.pending[game_id]
+
+class MatchServer:
+    """Hosts games between the connected agents, pairing up their free game slots"""
+    def __init__(self, graph, team_size, matches, move_timeout=1.0, max_turns=500, seed=0):
+        self.graph = graph
+        self.distances = make_distances(graph)
+        self.team_size = team_size
+        self.matches = matches
+        self.move_timeout = move_timeout
+        self.max_turns = max_turns
+        self.seed = seed
+        nodes = list(graph.nodes())
+        self.red_base = nodes[0]
+        self.blue_base = nodes[-1]
+        self.red_positions = game.positions(graph, self.red_base, team_size)
+        self.blue_positions = game.positions(graph, self.blue_base, team_size)
+        # Sent to each agent once, when it connects
+        self.board_message = {"type": "board", "adjacency": [list(graph.neighbors(node)) for node in nodes],
+                              "team_size": team_size, "red_base": self.red_base, "blue_base": self.blue_base,
+                              "red": self.red_positions, "blue": self.blue_positions, "timeout": move_timeout}
+        self.slots = None
+        self.connections = []
+        self.handlers = []   # The task listening to each connection
+        self.results = []
+        self.failures = []   # (game id, error) for games abandoned because of an error
+
+    async def handle_connection(self, reader, writer):
+        """Greet a new agent, offer its game slots for matches and listen for its moves"""
+        try:
+            hello = json.loads(await reader.readline())
+        except ValueError:
+            writer.close()
+            return
+        connection = AgentConnection(reader, writer, str(hello.get("name", "agent")), max(1, int(hello.get("capacity", 1))))
+        self.connections.append(connection)
+        self.handlers.append(asyncio.current_task())
+        connection.send(self.board_message)
+        for slot in range(connection.capacity):
+            self.slots.put_nowait(connection)
+        await connection.listen()
+
+    async def next_slot(self, avoid=None):
+        """Take the next free game slot of a connected agent, preferring one that isn't the avoided agent"""
+        skipped = []
+        while True:
+            connection = await self.slots.get()
+            if connection.closed:
+                continue
+            # Agents only play themselves if no other agent has a free slot
+            if connection is not avoid or self.slots.empty():
+                break
+            skipped.append(connection)
+        for slot in skipped:
+            self.slots.put_nowait(slot)
+        return connection
+
+    async def matchmaker(self):
+        """Start each game as soon as there are two free slots, until every game has been started"""
+        tasks = []
+        for game_id in range(self.matches):
+            red = await self.next_slot()
+            blue = await self.next_slot(avoid=red)
+            tasks.append(asyncio.create_task(self.run_match(game_id, red, blue)))
+        await asyncio.gather(*tasks)
+
+    async def run_match(self, game_id, red, blue):
+        """Play one game between two agents, then free up their slots.
+        A game that fails is recorded in failures and abandoned, rather than stopping every other game with it."""
+        try:
+            state, fallbacks = await self.play_match(game_id, red, blue)
+        except Exception as error:
+            self.failures.append((game_id, repr(error)))
+            winner = None
+        else:
+            self.results.append(MatchResult(game_id, red.name, blue.name, state.winner, state.turn_count,
+                                            fallbacks["red"], fallbacks["blue"]))
+            winner = state.winner
+        for connection in (red, blue):
+            connection.send({"type": "end", "game": game_id, "winner": winner})
+            self.slots.put_nowait(connection)
+
+    async def play_match(self, game_id, red, blue):
+        """Play out one game, returning the final state and the number of fallback moves each team made"""
+        state = game.new_game(self.graph, self.team_size, self.red_base, self.blue_base, self.distances,
+                              seed=f"{self.seed}:{game_id}", starts=(self.red_positions, self.blue_positions))
+        state.max_turns = self.max_turns   # Drawn at the turn limit, or when a position repeats
+        players = state.red + state.blue
+        seats = {"red": red, "blue": blue}
+        deltas = {"red": [], "blue": []}   # Moves each team hasn't been told about yet
+        fallbacks = {"red": 0, "blue": 0}
+        for team, connection in seats.items():
+            connection.send({"type": "start", "game": game_id, "team": team})
+
+        while state.winner is None:
+            team = state.turn
+            message = {"type": "turn", "game": game_id, "team": team, "turn": state.turn_count, "moves": deltas[team],
+                       "carriers": carriers(state, players)}
+            deltas[team] = []
+            try:
+                reply = await seats[team].request_move(game_id, message, self.move_timeout)
+                # Exact types, as 1.0 (or True) would pass the checks below and only fail later in the game rules
+                if type(reply["player"]) is not int or type(reply["node"]) is not int:
+                    raise ValueError("Moves are given by integer player and node indices")
+                if not 0 <= reply["player"] < len(players):
+                    raise ValueError("No such player")
+                player = players[reply["player"]]
+                node = reply["node"]
+                # Only accept moves by the team's own players, along an edge
+                if player.team != team or node not in self.graph.neighbors(player.position):
+                    raise ValueError("Illegal move")
+            except (asyncio.TimeoutError, ConnectionError, ValueError, KeyError, TypeError, IndexError):
+                fallbacks[team] += 1
+                player, node = game.random_policy(state)
+            state.move_player(player, node)
+            for delta in deltas.values():
+                delta.append([players.index(player), node])
+        return state, fallbacks
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """Listen on a TCP port (or a Unix socket if a path is given) until all the games have been played"""
+        self.slots = asyncio.Queue()
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await self.matchmaker()
+            for connection in self.connections:
+                connection.send({"type": "finished"})
+                connection.writer.close()
+            # Let each connection's listener see the connection close, rather than cancelling it
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+        return self.results
+
+class AgentClient:
+    """Connects to a match server and plays its games with a policy, a function from a GameState (on the agent's
+    turn) to the (player, node) to move.
+    Policies are called on the client's event loop, so slow policies should be spread over several clients."""
+    def __init__(self, policy=game.heuristic_policy, name="heuristics", capacity=16):
+        self.policy = policy
+        self.name = name
+        self.capacity = capacity
+        self.games = {}   # (game id, team) -> state, since an agent may be playing both sides of a game
+        self.results = []
+        self.setup = None   # The board message from the server
+        self.graph = None
+        self.distances = None
+
+    def handle(self, message):
+        """Update the games from a server message, returning the move to send back if it is the agent's turn"""
+        setup = self.setup
+        if message["type"] == "start":
+            state = game.new_game(self.graph, setup["team_size"], setup["red_base"], setup["blue_base"], self.distances,
+                                  seed=message["game"], starts=(setup["red"], setup["blue"]))
+            self.games[(message["game"], message["team"])] = state
+        elif message["type"] == "turn":
+            state = self.games[(message["game"], message["team"])]
+            players = state.red + state.blue
+            # Catch up with the moves made since this agent's last turn
+            for player, node in message["moves"]:
+                state.move_player(players[player], node)
+            player, node = self.policy(state)
+            return {"game": message["game"], "turn": message["turn"], "player": players.index(player), "node": node}
+        elif message["type"] == "end":
+            self.games.pop((message["game"], "red"), None)
+            self.games.pop((message["game"], "blue"), None)
+            self.results.append((message["game"], message["winner"]))
+        return None
+
+    async def run(self, host="127.0.0.1", port=8765, path=None):
+        """Play games until the server has finished"""
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        writer.write(encode({"type": "hello", "name": self.name, "capacity": self.capacity}))
+        await writer.drain()
+
+        self.setup = json.loads(await reader.readline())
+        self.graph = Board.from_adjacency(self.setup["adjacency"])
+        self.distances = make_distances(self.graph)
+        while True:
+            try:
+                line = await reader.readline()
+            except ConnectionError:
+                break   # The server has gone
+            if not line:
+                break
+            message = json.loads(line)
+            if message["type"] == "finished":
+                break
+            reply = self.handle(message)
+            if reply is not None:
+                writer.write(encode(reply))
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    break
+        writer.close()
+        return self.results
+
+def main():
+    """Host games, or connect an agent that plays with the built-in heuristics"""
+    parser = argparse.ArgumentParser(description="Host Prototype3 games for agents in other processes.")
+    parser.add_argument("command", choices=["serve", "agent"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="path of a Unix socket to use instead of TCP")
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--height", type=int, default=3)
+    parser.add_argument("--team-size", type=int, default=3)
+    parser.add_argument("--matches", type=int, default=100)
+    parser.add_argument("--move-timeout", type=float, default=1.0)
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--name", default="heuristics")
+    parser.add_argument("--capacity", type=int, default=16, help="number of games the agent plays at once")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = MatchServer(board.grid(args.width, args.height), args.team_size, args.matches, args.move_timeout,
+                             args.max_turns, args.seed)
+        results = asyncio.run(server.serve(args.host, args.port, args.unix))
+        for result in sorted(results):
+            print(result)
+        print(f"Red wins: {sum(result.winner == 'Red' for result in results)}, "
+              f"Blue wins: {sum(result.winner == 'Blue' for result in results)}, "
+              f"draws: {sum(result.winner == 'Draw' for result in results)}, "
+              f"fallback moves: {sum(result.red_fallbacks + result.blue_fallbacks for result in results)}")
+        for game_id, error in sorted(server.failures):
+            print(f"Game {game_id} failed: {error}")
+    else:
+        client = AgentClient(name=args.name, capacity=args.capacity)
+        results = asyncio.run(client.run(args.host, args.port, args.unix))
+        print(f"{args.name} played {len(results)} games")
+
+if __name__ == "__main__":
+    main()
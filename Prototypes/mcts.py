@@ -0,0 +1,210 @@
+# FILE:         mcts.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  A Monte Carlo Tree Search agent for the Prototype3 game, choosing which player to move and where.
+#               The tree is explored with UCT, and positions are valued by playing quick games (rollouts) to the end
+#               with a cheap policy: a greedy step along the precomputed next hops, or a random neighbour.
+#               Rollouts only use the CompactState and plain tuples/arrays, never networkx.
+#               The search can be run in several processes at once, combining the visit counts at the root. Each worker
+#               is sent the board and builds its own distances, rather than being sent a pickled copy of the tables.
+
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import math
+import random
+import time
+from compact_state import CompactState, RED, BLUE, NO_PLAYER, adjacency_lists
+from distances import make_distances
+
+game = importlib.import_module("Prototype3-Teams")
+
+class TreeNode:
+    # Nodes don't point back to their parents, so a finished tree has no reference cycles and is freed straight away
+    # rather than by the garbage collector, whose pauses grow with the size of the tree
+    __slots__ = ("move", "children", "untried", "visits", "wins", "team")
+
+    def __init__(self, move, untried, team):
+        self.move = move            # The (player, node) move that led here
+        self.children = []
+        self.untried = untried      # Moves that haven't been expanded yet
+        self.visits = 0
+        self.wins = 0.0             # Wins for the team that made the move
+        self.team = team            # The team that made the move
+
+    def select_child(self, exploration):
+        """Pick the child with the highest UCT value"""
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+class Searcher:
+    def __init__(self, adjacency, next_steps, exploration=1.4, rollout_depth=100, greedy=0.8):
+        self.adjacency = adjacency      # Neighbours of each node
+        self.next_steps = next_steps    # next_steps[target][node] is the next node on the shortest path to target
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.greedy = greedy            # Probability of a rollout taking the greedy step rather than a random one
+        self.root = None                # The root of the tree while it is being built, which can be read meanwhile
+
+    def search(self, state, iterations=1000, time_limit=None, seed=0):
+        """Build a search tree from the state, returning the number of visits to each root move"""
+        rng = random.Random(seed)
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        root = TreeNode(None, state.legal_moves(self.adjacency), 1 - state.turn)
+        root.visits = 1
+        self.root = root
+
+        for iteration in range(iterations):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            node = root
+            path = [root]   # The nodes visited, to update on the way back up
+            current = state.clone()
+            # Selection: follow the best children until reaching a node with unexpanded moves
+            while not node.untried and node.children:
+                node = node.select_child(self.exploration)
+                path.append(node)
+                current.apply_move(*node.move)
+            # Expansion: add one of the unexpanded moves to the tree
+            if node.untried and current.winner is None:
+                move = node.untried.pop(rng.randrange(len(node.untried)))
+                team = current.turn
+                current.apply_move(*move)
+                untried = current.legal_moves(self.adjacency) if current.winner is None else []
+                child = TreeNode(move, untried, team)
+                node.children.append(child)
+                path.append(child)
+            # Simulation: play the game out quickly
+            winner = self.rollout(current, rng)
+            # Backpropagation: update the win counts back up to the root
+            for node in path:
+                node.visits += 1
+                if winner is None:
+                    node.wins += 0.5
+                elif winner == node.team:
+                    node.wins += 1
+
+        self.root = None    # Let the tree go now rather than keep it alive until the next search
+        return {child.move: child.visits for child in root.children}
+
+    def rollout(self, state, rng):
+        """Play the game out with the default policy and return the winning team (None if unfinished)"""
+        adjacency = self.adjacency
+        positions = state.positions
+        team_players = (state.players(RED), state.players(BLUE))
+        for step in range(self.rollout_depth):
+            if state.winner is not None:
+                break
+            player = rng.choice(team_players[state.turn])
+            if rng.random() < self.greedy:
+                # Head for the target: home if carrying the flag, the carrier if the team's flag is taken, else the enemy flag
+                team = state.turn
+                if state.carriers[1 - team] == player:
+                    target = state.bases[team]
+                elif state.carriers[team] != NO_PLAYER:
+                    target = positions[state.carriers[team]]
+                else:
+                    target = state.flag_position(1 - team)
+                node = self.next_steps[target][positions[player]]
+                if node == positions[player]:
+                    node = rng.choice(adjacency[node])   # Already on the target, so move somewhere else
+            else:
+                node = rng.choice(adjacency[positions[player]])
+            state.apply_move(player, node)
+        return state.winner
+
+class FieldNextSteps:
+    """next_steps[target] from any of the distance oracles, building each target's BFS field the first time a rollout
+    heads for it (so an all-pairs oracle only builds the rows the rollouts use)"""
+    def __init__(self, distances):
+        self.distances = distances
+
+    def __getitem__(self, target):
+        return self.distances.field(target)[1]
+
+# Each worker process keeps its own searcher, so the board is only sent once
+worker_searcher = None
+
+def init_worker(graph, exploration, rollout_depth, greedy):
+    """Set up the searcher in a worker process, with its own distances for the board"""
+    global worker_searcher
+    worker_searcher = Searcher(adjacency_lists(graph), FieldNextSteps(make_distances(graph)), exploration,
+                               rollout_depth, greedy)
+
+def worker_search(state, iterations, time_limit, seed):
+    """Run a search in a worker process"""
+    return worker_searcher.search(state, iterations, time_limit, seed)
+
+class MCTSAgent:
+    def __init__(self, graph, distances=None, iterations=2000, time_limit=None, exploration=1.4,
+                 rollout_depth=100, greedy=0.8, processes=1, seed=0):
+        distances = distances if distances is not None else make_distances(graph)
+        self.searcher = Searcher(adjacency_lists(graph), FieldNextSteps(distances), exploration, rollout_depth, greedy)
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.processes = processes
+        self.rng = random.Random(seed)
+        self.pool = None
+        self.search_turn = None     # The turn the searcher's tree is for
+        if processes > 1:
+            # Root parallel search: each process builds its own tree and the root visit counts are added together
+            self.pool = ProcessPoolExecutor(processes, initializer=init_worker,
+                                            initargs=(graph, exploration, rollout_depth, greedy))
+
+    def choose(self, state, deadline=None):
+        """Return the (player, node) move to make from a Prototype3 GameState.
+        If a deadline (a time.perf_counter() time) is given, the search stops then instead of after time_limit."""
+        time_limit = self.time_limit if deadline is None else max(0.0, deadline - time.perf_counter())
+        compact = CompactState.from_game_state(state)
+        self.search_turn = state.turn_count
+        if self.pool is None:
+            visits = self.searcher.search(compact, self.iterations, time_limit, self.rng.getrandbits(32))
+        else:
+            futures = [self.pool.submit(worker_search, compact, self.iterations, time_limit, self.rng.getrandbits(32))
+                       for process in range(self.processes)]
+            visits = {}
+            for future in futures:
+                for move, count in future.result().items():
+                    visits[move] = visits.get(move, 0) + count
+        # The most visited move is the most reliable choice
+        if not visits:
+            player, node = compact.legal_moves(self.searcher.adjacency)[0]   # Out of time before any iterations
+        else:
+            player, node = max(visits, key=visits.get)
+        return (state.red + state.blue)[player], node
+
+    def best_so_far(self, state):
+        """Return the most visited (player, node) move of the search of the state so far, or None.
+        Only searches in this process can be read while they run, so there is never a move when using workers."""
+        root = self.searcher.root
+        if root is None or self.search_turn != state.turn_count:
+            return None
+        children = list(root.children)  # Copied, as the search may still be adding to them
+        if not children:
+            return None
+        player, node = max(children, key=lambda child: child.visits).move
+        return (state.red + state.blue)[player], node
+
+    def close(self):
+        """Shut down the worker processes"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+def main():
+    """Play the MCTS agent (red) against the heuristics (blue)"""
+    graph = game.build_graph()
+    state = game.new_game(graph, 3, seed=42)
+    agent = MCTSAgent(graph, state.distances, iterations=2000)
+
+    while state.winner is None and state.turn_count < 200:
+        if state.turn == "red":
+            player, node = agent.choose(state)
+            state.move_player(player, node)
+        else:
+            state.play_turn()
+    agent.close()
+    print("WINNER: ", state.winner)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# FILE:         profiling.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Lightweight instrumentation for the Prototype3 decision making.
+#               When enabled, the heuristics and rule checks record how long they take and how often they are called,
+#               the distance oracles count their queries for each turn, and the random fallbacks count how often they fire.
+#               The results can be saved as JSON, or as a Chrome trace (chrome://tracing or Perfetto) for a single game.
+#               When disabled, each instrumented call only costs a check that the metrics object is None.
+
+from collections import defaultdict
+import argparse
+import functools
+import importlib
+import json
+import time
+
+# The active Metrics object, or None when instrumentation is turned off
+metrics = None
+
+def percentile(values, fraction):
+    """Return a percentile of a sorted list of values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class Metrics:
+    def __init__(self, trace=False):
+        self.counts = defaultdict(int)      # How many times each event has happened
+        self.calls = defaultdict(int)       # How many times each timed function has been called
+        self.times = defaultdict(float)     # Total seconds spent in each timed function
+        self.turn_queries = []              # Distance queries made in each turn
+        self.turn_start_queries = 0
+        self.events = [] if trace else None # Chrome trace events, only kept for sampled games
+        self.origin = time.perf_counter()
+
+    def count(self, name, amount=1):
+        """Count an event"""
+        self.counts[name] += amount
+
+    def record_call(self, name, start, end):
+        """Record a call to a timed function"""
+        self.calls[name] += 1
+        self.times[name] += end - start
+        if self.events is not None:
+            self.events.append({"name": name, "ph": "X", "pid": 0, "tid": 0,
+                                "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6})
+
+    def end_turn(self):
+        """Record the number of distance queries made in the turn that has just finished"""
+        queries = self.counts["distance_queries"]
+        self.turn_queries.append(queries - self.turn_start_queries)
+        self.turn_start_queries = queries
+
+    def to_dict(self):
+        """Return the metrics as a dictionary that can be saved as JSON"""
+        turns = len(self.turn_queries)
+        return {
+            "turns": turns,
+            "counts": dict(self.counts),
+            "functions": {name: {"calls": self.calls[name], "total_seconds": self.times[name],
+                                 "mean_microseconds": 1e6 * self.times[name] / self.calls[name]}
+                          for name in sorted(self.calls)},
+            "distance_queries_per_turn": {"mean": sum(self.turn_queries) / turns if turns else 0,
+                                          "max": max(self.turn_queries, default=0)},
+        }
+
+    def dump_json(self, path):
+        """Save the metrics to a JSON file"""
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def dump_chrome_trace(self, path):
+        """Save the traced calls in the Chrome trace event format"""
+        if self.events is None:
+            raise ValueError("Tracing was not turned on for these metrics")
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
+
+def enable(trace=False):
+    """Start recording metrics, returning the Metrics object they are recorded in"""
+    global metrics
+    metrics = Metrics(trace)
+    return metrics
+
+def disable():
+    """Stop recording metrics, returning the Metrics object that was being used"""
+    global metrics
+    finished, metrics = metrics, None
+    return finished
+
+def count(name, amount=1):
+    """Count an event, if metrics are being recorded"""
+    if metrics is not None:
+        metrics.count(name, amount)
+
+def timed(name):
+    """Decorator that records the time spent in a function, if metrics are being recorded"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if metrics is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.record_call(name, start, time.perf_counter())
+        return wrapper
+    return decorator
+
+def main():
+    """Profile a game on the default board and save the metrics and a trace"""
+    parser = argparse.ArgumentParser(description="Profile the Prototype3 heuristics for one game.")
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--json", default="metrics.json")
+    parser.add_argument("--trace", default="trace.json")
+    args = parser.parse_args()
+
+    game = importlib.import_module("Prototype3-Teams")
+    # When run as a script this file is __main__, so switch on the copy of the module that the game imported
+    instrumentation = importlib.import_module("profiling")
+    recorded = instrumentation.enable(trace=True)
+    result = game.run_game(game.build_graph(), args.players, seed=args.seed, max_turns=args.max_turns)
+    instrumentation.disable()
+    recorded.dump_json(args.json)
+    recorded.dump_chrome_trace(args.trace)
+    print(result)
+    print(json.dumps(recorded.to_dict(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# FILE:         selfplay.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Generate training data for learned agents by playing Prototype3 games between agents.
+#               Before each move the GameState is encoded as fixed size feature planes over the board's nodes (each
+#               team's occupancy, the flags, their carriers and the bases) along with whose turn it is, and stored
+#               with the move that was chosen and the final result of the game.
+#               Games are played across a pool of processes, each writing its positions straight to its own sharded,
+#               compressed .npz files once a shard is full, so memory use stays bounded however many games are played.
+#               While a game is played only its moves are kept; once its result is known it is replayed, encoding each
+#               position straight into the shard buffer, so a long game on a big board never needs a buffer of its own.
+#               The built-in agents are deterministic enough that every seed can play the same game, so each game opens
+#               with a few random moves and then explores with a random move now and then (epsilon-greedy). These moves
+#               are marked in the 'explored' array, so they can be left out when training a policy on the moves chosen.
+
+import argparse
+import importlib
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from atomic import atomic_file
+from compact_state import RED, BLUE
+from tournament import GRAPH_FAMILIES, load_graph
+
+game = importlib.import_module("Prototype3-Teams")
+
+# The feature planes, each with one entry per node
+PLANES = ["red_players", "blue_players", "red_flag", "blue_flag", "red_carrier", "blue_carrier", "red_base", "blue_base"]
+
+# Agents that can be named on the command line, each a function from a GameState to the (player, node) to move
+AGENTS = {
+    "heuristic": game.heuristic_policy,
+    "random": game.random_policy,
+}
+
+def load_agent(name):
+    """Return a built-in agent, or one given as module:function"""
+    if name in AGENTS:
+        return AGENTS[name]
+    module, function = name.split(":")
+    return getattr(importlib.import_module(module), function)
+
+def encode(state, planes):
+    """Fill in the feature planes (an array of len(PLANES) x nodes) for a state"""
+    planes.fill(0)
+    # The occupancy index already holds how many of each team are on each node
+    for team, plane in (("red", 0), ("blue", 1)):
+        for node, count in state.occupancy[team].items():
+            planes[plane, node] = min(count, 255)
+    planes[2, state.red_flag.position] = 1
+    planes[3, state.blue_flag.position] = 1
+    if state.red_flag.carried_by is not None:
+        planes[4, state.red_flag.carried_by.position] = 1
+    if state.blue_flag.carried_by is not None:
+        planes[5, state.blue_flag.carried_by.position] = 1
+    planes[6, state.red_base] = 1
+    planes[7, state.blue_base] = 1
+
+class ShardWriter:
+    """Collects positions into a fixed size buffer, writing it out as a compressed shard each time it fills up"""
+    def __init__(self, directory, prefix, num_nodes, shard_bytes=64 * 2**20):
+        self.directory = directory
+        self.prefix = prefix
+        # Size the shards so the buffer stays within shard_bytes, whatever the size of the board
+        self.shard_size = max(1, shard_bytes // (len(PLANES) * num_nodes))
+        self.planes = np.zeros((self.shard_size, len(PLANES), num_nodes), dtype=np.uint8)
+        self.turns = np.zeros(self.shard_size, dtype=np.uint8)       # RED or BLUE to move
+        self.players = np.zeros(self.shard_size, dtype=np.int16)     # Index of the player moved, red players first
+        self.moves = np.zeros(self.shard_size, dtype=np.int32)       # Node the player moved to
+        self.outcomes = np.zeros(self.shard_size, dtype=np.int8)     # 1 if red won, -1 if blue won, 0 if drawn
+        self.games = np.zeros(self.shard_size, dtype=np.int64)       # Seed of the game
+        self.plies = np.zeros(self.shard_size, dtype=np.int32)       # Turn number within the game
+        self.explored = np.zeros(self.shard_size, dtype=np.uint8)    # 1 if the move was a random exploring move
+        self.count = 0
+        self.shards = []
+        self.positions = 0
+
+    def add_game(self, state, players, moves, explored, outcome, game_id):
+        """Add every position from a finished game, replaying its moves from the starting state and encoding each
+        position straight into the buffer, writing shards as they fill up"""
+        everyone = state.red + state.blue
+        for ply in range(len(moves)):
+            row = self.count
+            encode(state, self.planes[row])
+            self.turns[row] = RED if state.turn == "red" else BLUE
+            self.players[row] = players[ply]
+            self.moves[row] = moves[ply]
+            self.outcomes[row] = outcome
+            self.games[row] = game_id
+            self.plies[row] = ply
+            self.explored[row] = explored[ply]
+            self.count += 1
+            if self.count == self.shard_size:
+                self.flush()
+            state.move_player(everyone[players[ply]], int(moves[ply]))
+
+    def flush(self):
+        """Write the buffered positions to the next shard"""
+        if self.count == 0:
+            return
+        path = os.path.join(self.directory, f"{self.prefix}-{len(self.shards):05d}.npz")
+        # Written atomically, so readers never see a half written shard
+        with atomic_file(path, "wb") as file:
+            np.savez_compressed(file, planes=self.planes[:self.count], turns=self.turns[:self.count],
+                                players=self.players[:self.count], moves=self.moves[:self.count],
+                                outcomes=self.outcomes[:self.count], games=self.games[:self.count],
+                                plies=self.plies[:self.count], explored=self.explored[:self.count])
+        self.shards.append(path)
+        self.positions += self.count
+        self.count = 0
+
+def play_games(task):
+    """Play a block of games and write their positions to shards (run in a worker process)"""
+    (index, seeds, family, size, board_seed, team_size, red_agent, blue_agent, max_turns, output, shard_bytes, catalogue_dir,
+     opening_moves, epsilon) = task
+    graph, distances = load_graph(family, size, board_seed, catalogue_dir)
+    policies = {"red": load_agent(red_agent), "blue": load_agent(blue_agent)}
+    nodes = list(graph.nodes())
+    red_base = nodes[0]
+    blue_base = nodes[-1]
+    red_positions = game.positions(graph, red_base, team_size)
+    blue_positions = game.positions(graph, blue_base, team_size)
+    writer = ShardWriter(output, f"shard-{index:05d}", len(nodes), shard_bytes)
+
+    # One game's moves are kept until its result is known, a few bytes a turn whatever the size of the board
+    players = np.zeros(max_turns, dtype=np.int16)
+    moves = np.zeros(max_turns, dtype=np.int32)
+    explored = np.zeros(max_turns, dtype=np.uint8)
+    for seed in seeds:
+        state = game.new_game(graph, team_size, red_base, blue_base, distances, seed, (red_positions, blue_positions))
+        # The exploring moves have their own stream, so the agents' randomness is the same with or without them
+        explore = random.Random(f"explore:{seed}")
+        everyone = state.red + state.blue
+        while state.winner is None and state.turn_count < max_turns:
+            ply = state.turn_count
+            move = game.exploring_move(state, explore, opening_moves, epsilon)
+            if move is not None:
+                player, node = move
+                explored[ply] = 1
+            else:
+                player, node = policies[state.turn](state)
+                explored[ply] = 0
+            players[ply] = everyone.index(player)
+            moves[ply] = node
+            state.move_player(player, node)
+        outcome = {"Red": 1, "Blue": -1}.get(state.winner, 0)
+        length = state.turn_count
+        start = game.new_game(graph, team_size, red_base, blue_base, distances, seed, (red_positions, blue_positions))
+        writer.add_game(start, players[:length], moves[:length], explored[:length], outcome, seed)
+    writer.flush()
+    return len(seeds), writer.positions, writer.shards
+
+def read_shards(directory):
+    """Yield the arrays of each shard in a directory, in order"""
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".npz"):
+            with np.load(os.path.join(directory, name)) as shard:
+                yield {key: shard[key] for key in shard.files}
+
+def generate(output, family="grid", size=4, board_seed=0, team_size=3, games=1000, red_agent="heuristic",
+             blue_agent="heuristic", max_turns=500, workers=None, shard_bytes=64 * 2**20, catalogue_dir=None, seed=0,
+             opening_moves=4, epsilon=0.05):
+    """Play games across a pool of processes, writing their positions to shards in the output directory.
+    Each game starts with opening_moves random moves, and after that makes a random move with probability epsilon."""
+    os.makedirs(output, exist_ok=True)
+    workers = workers or os.cpu_count()
+    # Give each worker several blocks of games, so they all finish at about the same time
+    block = max(1, games // (workers * 4))
+    seeds = range(seed, seed + games)
+    tasks = [(index, seeds[start:start + block], family, size, board_seed, team_size, red_agent, blue_agent, max_turns,
+              output, shard_bytes, catalogue_dir, opening_moves, epsilon)
+             for index, start in enumerate(range(0, games, block))]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(play_games, tasks))
+    # Describe the data alongside the shards
+    with open(os.path.join(output, "meta.json"), "w") as file:
+        json.dump({"family": family, "size": size, "board_seed": board_seed, "team_size": team_size, "games": games,
+                   "red_agent": red_agent, "blue_agent": blue_agent, "max_turns": max_turns,
+                   "opening_moves": opening_moves, "epsilon": epsilon, "planes": PLANES,
+                   "positions": sum(result[1] for result in results)}, file, indent=2)
+    return results
+
+def main():
+    """Generate self-play data from the command line"""
+    parser = argparse.ArgumentParser(description="Generate training positions by playing Prototype3 games between agents.")
+    parser.add_argument("output", help="directory to write the shards to")
+    parser.add_argument("--family", default="grid", choices=sorted(GRAPH_FAMILIES))
+    parser.add_argument("--size", type=int, default=4)
+    parser.add_argument("--board-seed", type=int, default=0, help="seed of the board, for random graphs")
+    parser.add_argument("--team-size", type=int, default=3)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--red-agent", default="heuristic", help=f"one of {sorted(AGENTS)} or module:function")
+    parser.add_argument("--blue-agent", default="heuristic", help=f"one of {sorted(AGENTS)} or module:function")
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--shard-mb", type=int, default=64, help="size of the buffer for each shard, before compression")
+    parser.add_argument("--catalogue", default=None, help="directory of the board catalogue to load distances from")
+    parser.add_argument("--opening-moves", type=int, default=4, help="random moves at the start of each game")
+    parser.add_argument("--epsilon", type=float, default=0.05, help="chance of a random move after the opening")
+    args = parser.parse_args()
+
+    results = generate(args.output, args.family, args.size, args.board_seed, args.team_size, args.games, args.red_agent,
+                       args.blue_agent, args.max_turns, args.workers, args.shard_mb * 2**20, args.catalogue, args.seed,
+                       args.opening_moves, args.epsilon)
+    print(f"{sum(result[0] for result in results)} games, {sum(result[1] for result in results)} positions, "
+          f"{sum(len(result[2]) for result in results)} shards written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# FILE:         tablebase.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Solve the Prototype3 game exactly on small boards, by retrograde analysis.
+#               Every position is numbered: each team is the multiset of nodes its players are on, plus the node of
+#               the player carrying the enemy flag (if any), since players on the same team are interchangeable.
+#               The positions where a capture is one move away are labelled first, then the solver works backwards a
+#               ply at a time: a position is won if some move reaches a lost position, and lost once every move
+#               reaches a won position. Whatever is left unlabelled is a draw, as neither side can force a capture.
+#               The result (how many plies until the side to move wins or loses) is saved as a .npy table and memory
+#               mapped, so the TablebaseAgent plays perfectly with a handful of table lookups per move.
+
+import argparse
+import itertools
+import importlib
+import json
+import os
+import time
+import numpy as np
+import board
+from atomic import atomic_directory
+from catalogue import board_hash
+from compact_state import RED, BLUE
+from distances import make_distances
+
+game = importlib.import_module("Prototype3-Teams")
+
+# Where solved tables are saved, which can be changed with the CTF_TABLEBASES environment variable
+TABLEBASES = os.environ.get("CTF_TABLEBASES", os.path.join(os.path.expanduser("~"), ".cache", "ctf_tablebases"))
+
+# Values are the plies until the side to move wins (positive) or loses (negative), or 0 for a draw.
+# Positions where a flag has already been captured are never reached in play, and are marked as over.
+GAME_OVER = -32768
+
+class TeamEncoding:
+    """Numbers every arrangement of one team: the nodes its players are on, and which of them carries the enemy flag.
+    The nodes of the players without the flag are ranked as a sorted multiset with the combinatorial number system,
+    so an arrangement is numbered (and looked up) without a dict."""
+    def __init__(self, num_nodes, team_size):
+        self.num_nodes = num_nodes
+        self.team_size = team_size
+        self.binomials = [[0] * (team_size + 1) for n in range(num_nodes + team_size)]
+        for n in range(num_nodes + team_size):
+            self.binomials[n][0] = 1
+            for k in range(1, min(n, team_size) + 1):
+                self.binomials[n][k] = self.binomials[n - 1][k - 1] + self.binomials[n - 1][k]
+        # Number of arrangements without the enemy flag, and (for each carrier node) with it
+        self.free = self.multisets(team_size)
+        self.carrying = self.multisets(team_size - 1)
+        self.size = self.free + num_nodes * self.carrying
+
+    def multisets(self, count):
+        """Return the number of ways count players can be placed on the nodes"""
+        n = self.num_nodes + count - 1
+        return self.binomials[n][count] if n >= 0 else 1
+
+    def rank(self, nodes):
+        """Return the rank of a sorted list of nodes among the multisets of its size"""
+        rank = 0
+        for i, node in enumerate(nodes):
+            rank += self.binomials[node + i][i + 1]
+        return rank
+
+    def index(self, nodes, carrier=None):
+        """Number an arrangement, given the sorted nodes of the players without the flag and the carrier's node"""
+        if carrier is None:
+            return self.rank(nodes)
+        return self.free + carrier * self.carrying + self.rank(nodes)
+
+    def arrangements(self):
+        """Return the (carrier, nodes) of every arrangement, in order of their numbers"""
+        decoded = [None] * self.size
+        for nodes in itertools.combinations_with_replacement(range(self.num_nodes), self.team_size):
+            decoded[self.index(nodes)] = (None, nodes)
+        for carrier in range(self.num_nodes):
+            for nodes in itertools.combinations_with_replacement(range(self.num_nodes), self.team_size - 1):
+                decoded[self.index(nodes, carrier)] = (carrier, nodes)
+        return decoded
+
+def team_moves(graph, encoding, decoded, own_base, enemy_base):
+    """List the moves of a team from each of its arrangements, as (from node, carrier moved, to node, new arrangement,
+    wins) tuples. Moves that lead to the same arrangement by moving team mates on the same node are only listed once."""
+    moves = []
+    for carrier, nodes in decoded:
+        arrangement_moves = []
+        # The carrier wins by reaching their own base
+        if carrier is not None:
+            for node in graph.neighbors(carrier):
+                arrangement_moves.append((carrier, True, node, encoding.index(nodes, node), node == own_base))
+        for position in sorted(set(nodes)):
+            rest = list(nodes)
+            rest.remove(position)
+            for node in graph.neighbors(position):
+                # Reaching the enemy base picks up their flag, unless the team already has it
+                if carrier is None and node == enemy_base:
+                    arrangement_moves.append((position, False, node, encoding.index(rest, node), False))
+                else:
+                    arrangement_moves.append((position, False, node, encoding.index(sorted(rest + [node]), carrier), False))
+        moves.append(arrangement_moves)
+    return moves
+
+def interceptions(encoding, decoded, bases):
+    """Return the table of what each arrangement becomes when an opponent moves onto each node, since landing on
+    the flag carrier (outside a base) resets the flag"""
+    table = np.tile(np.arange(encoding.size, dtype=np.int32)[:, None], (1, encoding.num_nodes))
+    for arrangement, (carrier, nodes) in enumerate(decoded):
+        if carrier is not None and carrier not in bases:
+            table[arrangement, carrier] = encoding.index(sorted(nodes + (carrier,)))
+    return table
+
+class Tablebase:
+    """The solved values of every position on a board, for a team size and pair of bases"""
+    def __init__(self, graph, team_size, red_base, blue_base, values=None):
+        self.graph = graph
+        self.team_size = team_size
+        self.red_base = red_base
+        self.blue_base = blue_base
+        self.encoding = TeamEncoding(graph.number_of_nodes(), team_size)
+        decoded = self.encoding.arrangements()
+        self.decoded = decoded
+        # The moves of each team from each of its arrangements
+        self.moves = (team_moves(graph, self.encoding, decoded, red_base, blue_base),
+                      team_moves(graph, self.encoding, decoded, blue_base, red_base))
+        self.intercepts = interceptions(self.encoding, decoded, (red_base, blue_base))
+        self.values = values
+        self.num_positions = 2 * self.encoding.size ** 2
+
+    def position(self, turn, red, blue):
+        """Number a position from whose turn it is and each team's arrangement"""
+        return (turn * self.encoding.size + red) * self.encoding.size + blue
+
+    def arrangement(self, players, carrier):
+        """Number a team's arrangement from its players and the one carrying the enemy flag (or None)"""
+        nodes = sorted(player.position for player in players if player is not carrier)
+        return self.encoding.index(nodes, None if carrier is None else carrier.position)
+
+    def arrangements(self, state):
+        """Return the numbers of the red and blue arrangements in a GameState"""
+        return (self.arrangement(state.red, state.blue_flag.carried_by),
+                self.arrangement(state.blue, state.red_flag.carried_by))
+
+    def successor(self, turn, mover, enemy, move):
+        """Return the position after a (non-winning) move by the team whose turn it is"""
+        node, new = move[2], move[3]
+        enemy = self.intercepts[enemy, node]
+        if turn == RED:
+            return self.position(BLUE, new, enemy)
+        return self.position(RED, enemy, new)
+
+    def value(self, state):
+        """Return the value of a GameState for the team whose turn it is"""
+        red, blue = self.arrangements(state)
+        return int(self.values[self.position(RED if state.turn == "red" else BLUE, red, blue)])
+
+    def solve(self, values):
+        """Label every position by retrograde analysis, writing the values into the given array"""
+        size = self.encoding.size
+        half = size * size
+        sources = []
+        targets = []
+        winning = []
+        for turn in (RED, BLUE):
+            # Flatten the team's moves so every enemy arrangement can be handled at once
+            flat = [(arrangement,) + move for arrangement, moves in enumerate(self.moves[turn]) for move in moves]
+            movers = np.array([move[0] for move in flat], dtype=np.int64)
+            nodes = np.array([move[3] for move in flat], dtype=np.int64)
+            news = np.array([move[4] for move in flat], dtype=np.int64)
+            wins = np.array([move[5] for move in flat], dtype=bool)
+            enemies = np.arange(size, dtype=np.int64)
+            if turn == RED:
+                source = turn * half + movers[:, None] * size + enemies[None, :]
+            else:
+                source = turn * half + enemies[None, :] * size + movers[:, None]
+            winning.append(source[wins].ravel())
+            source = source[~wins]
+            # The enemy's arrangement only changes if the move lands on their flag carrier
+            enemy_after = self.intercepts[:, nodes[~wins]].T.astype(np.int64)
+            if turn == RED:
+                target = (1 - turn) * half + news[~wins][:, None] * size + enemy_after
+            else:
+                target = (1 - turn) * half + enemy_after * size + news[~wins][:, None]
+            sources.append(source.ravel().astype(np.int32))
+            targets.append(target.ravel().astype(np.int32))
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+
+        # Positions where a flag has already been captured (its carrier is home) are over
+        over_red = np.array([carrier == self.red_base for carrier, nodes in self.decoded])
+        over_blue = np.array([carrier == self.blue_base for carrier, nodes in self.decoded])
+        over = np.tile((over_red[:, None] | over_blue[None, :]).ravel(), 2)
+
+        # Index the moves by the position they reach, to find the positions leading to each newly labelled one
+        order = np.argsort(targets, kind="stable")
+        predecessors = sources[order]
+        starts = np.zeros(self.num_positions + 1, dtype=np.int64)
+        np.cumsum(np.bincount(targets, minlength=self.num_positions), out=starts[1:])
+        del order, targets
+        remaining = np.bincount(sources, minlength=self.num_positions).astype(np.int32)   # Moves not yet shown to lose
+        del sources
+
+        values[:] = 0
+        solved = over.copy()
+        values[over] = GAME_OVER
+        # Positions with a capture available are won in one ply
+        frontier = np.unique(np.concatenate(winning))
+        frontier = frontier[~solved[frontier]]
+        values[frontier] = 1
+        solved[frontier] = True
+        plies = 1
+        while frontier.size:
+            # Find every move into the frontier
+            lengths = starts[frontier + 1] - starts[frontier]
+            offsets = np.repeat(starts[frontier] - np.cumsum(lengths) + lengths, lengths)
+            previous = predecessors[offsets + np.arange(lengths.sum())]
+            if plies % 2 == 1:
+                # The frontier is won, so a position is lost once all its moves lead into won positions
+                remaining -= np.bincount(previous, minlength=self.num_positions).astype(np.int32)
+                previous = np.unique(previous)
+                frontier = previous[~solved[previous] & (remaining[previous] == 0)]
+                values[frontier] = -(plies + 1)
+            else:
+                # The frontier is lost, so any position with a move into it is won
+                previous = np.unique(previous)
+                frontier = previous[~solved[previous]]
+                values[frontier] = plies + 1
+            solved[frontier] = True
+            plies += 1
+        return values
+
+class TablebaseAgent:
+    """Plays perfectly from a solved tablebase, looking up the value of the position after each move"""
+    def __init__(self, tablebase):
+        self.tablebase = tablebase
+
+    def choose(self, state, deadline=None):
+        """Return the (player, node) move to make from a Prototype3 GameState (a lookup is always within the deadline)"""
+        tablebase = self.tablebase
+        red, blue = tablebase.arrangements(state)
+        if state.turn == "red":
+            turn, mover, enemy, players, carrier = RED, red, blue, state.red, state.blue_flag.carried_by
+        else:
+            turn, mover, enemy, players, carrier = BLUE, blue, red, state.blue, state.red_flag.carried_by
+
+        # Rank each move by the result it leads to: the quickest win, then a draw, then the slowest loss
+        ranked = []
+        for move in tablebase.moves[turn][mover]:
+            if move[4]:
+                ranked.append(((0, 0), move))
+                continue
+            value = int(tablebase.values[tablebase.successor(turn, mover, enemy, move)])   # For the opponent
+            if value < 0:
+                ranked.append(((0, -value), move))
+            elif value == 0:
+                ranked.append(((1, 0), move))
+            else:
+                ranked.append(((2, -value), move))
+        best = min(rank for rank, move in ranked)
+        candidates = [move for rank, move in ranked if rank == best]
+
+        move = candidates[0]
+        # Neither side can force a capture, so play the heuristics' move if it keeps the draw, to test the opponent
+        if best == (1, 0) and len(candidates) > 1:
+            player, path = state.select_move()
+            if path is not None and len(path) > 1:
+                for candidate in candidates:
+                    if candidate[0] == player.position and candidate[1] == (player is carrier) and candidate[2] == path[1]:
+                        return player, path[1]
+        position, carrier_moved, node = move[0], move[1], move[2]
+        if carrier_moved:
+            return carrier, node
+        for player in players:
+            if player.position == position and player is not carrier:
+                return player, node
+
+def key(graph, team_size, red_base, blue_base):
+    """Return the name of the saved table for a board, team size and pair of bases"""
+    return f"{board_hash(graph)}-{team_size}-{red_base}-{blue_base}"
+
+def store(graph, team_size, red_base=None, blue_base=None, directory=TABLEBASES):
+    """Solve a board if it hasn't already been solved, returning its key"""
+    red_base = 0 if red_base is None else red_base
+    blue_base = graph.number_of_nodes() - 1 if blue_base is None else blue_base
+    name = key(graph, team_size, red_base, blue_base)
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return name
+
+    # Solve into a temporary directory, then rename it, so other processes never see a half written table
+    with atomic_directory(path) as temporary:
+        tablebase = Tablebase(graph, team_size, red_base, blue_base)
+        start = time.perf_counter()
+        values = np.lib.format.open_memmap(os.path.join(temporary, "values.npy"), mode="w+", dtype=np.int16,
+                                           shape=(tablebase.num_positions,))
+        tablebase.solve(values)
+        values.flush()
+        meta = {
+            "nodes": graph.number_of_nodes(),
+            "team_size": team_size,
+            "red_base": red_base,
+            "blue_base": blue_base,
+            "positions": tablebase.num_positions,
+            "wins": int(np.count_nonzero(values > 0)),
+            "losses": int(np.count_nonzero((values < 0) & (values != GAME_OVER))),
+            "draws": int(np.count_nonzero(values == 0)),
+            "longest": int(np.abs(values[values != GAME_OVER]).max(initial=0)),
+            "seconds": time.perf_counter() - start,
+        }
+        del values
+        with open(os.path.join(temporary, "meta.json"), "w") as file:
+            json.dump(meta, file)
+    return name
+
+def load(graph, name, directory=TABLEBASES):
+    """Open a solved table by its key, with its values memory mapped"""
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        raise KeyError(f"{name} is not in the tablebases at {directory}")
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+    values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+    tablebase = Tablebase(graph, meta["team_size"], meta["red_base"], meta["blue_base"], values)
+    tablebase.meta = meta
+    return tablebase
+
+def open_tablebase(graph, team_size, red_base=None, blue_base=None, directory=TABLEBASES):
+    """Open the table for a board, solving it first if it hasn't been solved"""
+    return load(graph, store(graph, team_size, red_base, blue_base, directory), directory)
+
+def new_game(graph, tablebase, distances=None, seed=None):
+    """Set up a GameState with the teams around the tablebase's bases, as in run_game"""
+    return game.new_game(graph, tablebase.team_size, tablebase.red_base, tablebase.blue_base, distances, seed)
+
+def describe(value):
+    """Describe a value for the side to move"""
+    if value > 0:
+        return f"wins in {value} plies"
+    if value < 0:
+        return f"loses in {-value} plies"
+    return "draws"
+
+def play(graph, tablebase, agent_team, seed, max_turns, distances=None):
+    """Play the tablebase agent against the heuristics, returning the winner and each side's time per move"""
+    state = new_game(graph, tablebase, distances, seed)
+    state.max_turns = max_turns
+    agent = TablebaseAgent(tablebase)
+    times = {"agent": [], "heuristics": []}
+    while state.winner is None:
+        start = time.perf_counter()
+        if state.turn == agent_team:
+            player, node = agent.choose(state)
+            state.move_player(player, node)
+            times["agent"].append(time.perf_counter() - start)
+        else:
+            state.play_turn()
+            times["heuristics"].append(time.perf_counter() - start)
+    return state.winner, times
+
+def main():
+    """Solve a grid and play the tablebase agent against the heuristics (balanced_move) as each team"""
+    parser = argparse.ArgumentParser(description="Solve a small Prototype3 board exactly and benchmark the perfect player.")
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--height", type=int, default=3)
+    parser.add_argument("--team-size", type=int, default=2)
+    parser.add_argument("--games", type=int, default=20, help="games to play as each team")
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--directory", default=TABLEBASES)
+    args = parser.parse_args()
+
+    graph = board.grid(args.width, args.height)
+    tablebase = open_tablebase(graph, args.team_size, directory=args.directory)
+    distances = make_distances(graph)   # Shared by every game
+    meta = tablebase.meta
+    print(f"{meta['positions']} positions solved in {meta['seconds']:.2f}s: {meta['wins']} won, {meta['losses']} lost, "
+          f"{meta['draws']} drawn for the side to move, longest forced result {meta['longest']} plies")
+    print(f"From the start, red (to move) {describe(tablebase.value(new_game(graph, tablebase, distances)))}")
+
+    for team in ("red", "blue"):
+        results = {"Red": 0, "Blue": 0, "Draw": 0}
+        times = {"agent": [], "heuristics": []}
+        for seed in range(args.games):
+            winner, game_times = play(graph, tablebase, team, seed, args.max_turns, distances)
+            results[winner] += 1
+            for side in times:
+                times[side].extend(game_times[side])
+        won = results[team.capitalize()]
+        lost = results["Blue" if team == "red" else "Red"]
+        print(f"Tablebase as {team}: won {won}, lost {lost}, drew {results['Draw']}; "
+              f"{1000 * sum(times['agent']) / max(1, len(times['agent'])):.3f} ms per move against "
+              f"{1000 * sum(times['heuristics']) / max(1, len(times['heuristics'])):.3f} ms for balanced_move")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# FILE:         tournament.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Run many headless Prototype3 games over a grid of configurations, using every core available.
+#               Each configuration sets the graph family, graph size, team size and base placement, and is played
+#               over a range of seeds. The results are collected into win rate and game length tables, along with how many
+#               games were drawn (by repeating a position, or reaching the turn limit).
+#               With --store, each result is saved to an experiment store as it comes in, and games already in the
+#               store are skipped, so an interrupted tournament can be run again to finish it.
+
+from collections import namedtuple, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import argparse
+import hashlib
+import importlib
+import itertools
+import math
+import os
+import random
+import time
+from board import GRAPH_FAMILIES
+import catalogue
+from distances import make_distances
+from experiment_store import ExperimentStore, agent_config
+
+game = importlib.import_module("Prototype3-Teams")
+
+# One point in the grid of configurations to be played
+Config = namedtuple("Config", ["family", "size", "team_size", "placement"])
+
+def game_seed(master_seed, config, seed):
+    """Derive an independent random stream for a single game from the master seed, configuration and seed"""
+    key = f"{master_seed}:{config.family}:{config.size}:{config.team_size}:{config.placement}:{seed}"
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+
+@lru_cache(maxsize=32)
+def load_graph(family, size, graph_seed, catalogue_dir=None):
+    """Build a graph and its distance table, cached so each worker only builds them once.
+    With a catalogue, the distances are memory mapped from disk instead, so the workers share one copy."""
+    graph = GRAPH_FAMILIES[family](size, graph_seed)
+    if catalogue_dir is not None:
+        entry = catalogue.open_board(graph, directory=catalogue_dir)
+        return entry.board, entry.distances
+    return graph, make_distances(graph)
+
+@lru_cache(maxsize=32)
+def diameter_bases(distances):
+    """Return two nodes as far apart as can be found with a double sweep: a BFS from the first node finds the node
+    furthest from it, and a BFS from there finds the node furthest from that. This is exact on paths, cycles, grids and
+    trees and close on other boards, for two BFS rather than a distance query for every pair of nodes.
+    Cached by the distances, which load_graph already keeps once per board."""
+    furthest = 0
+    for sweep in range(2):
+        start = furthest
+        distance = distances.bfs(start)[0]
+        furthest = max((node for node in range(len(distance)) if distance[node] != distances.unreachable),
+                       key=distance.__getitem__)
+    # Red takes the earlier node, as with the "ends" placement
+    first, second = sorted((start, furthest))
+    return distances.nodes[first], distances.nodes[second]
+
+def place_bases(graph, distances, placement, rng):
+    """Choose the red and blue base nodes"""
+    nodes = list(graph.nodes())
+    if placement == "ends":
+        return nodes[0], nodes[-1]   # The same as main()
+    elif placement == "diameter":
+        # Place the bases as far apart as possible
+        return diameter_bases(distances)
+    elif placement == "random":
+        red_base, blue_base = rng.sample(nodes, 2)
+        return red_base, blue_base
+    else:
+        raise ValueError(f"Unknown base placement: {placement}")
+
+def graph_seed(config, seed):
+    """Random graphs change with the seed, the other families are the same for every game"""
+    return seed if config.family == "random" else 0
+
+def play_game(task):
+    """Play one game of the tournament (run in a worker process)"""
+    config, seed, master_seed, max_turns, catalogue_dir = task
+    stream = game_seed(master_seed, config, seed)
+    graph, distances = load_graph(config.family, config.size, graph_seed(config, seed), catalogue_dir)
+    red_base, blue_base = place_bases(graph, distances, config.placement, random.Random(stream ^ 1))
+    start = time.perf_counter()
+    result = game.run_game(graph, config.team_size, seed=stream, max_turns=max_turns,
+                           red_base=red_base, blue_base=blue_base, distances=distances)
+    return config, seed, result, time.perf_counter() - start
+
+@lru_cache(maxsize=None)
+def graph_id(family, size, board_seed):
+    """Return the catalogue hash of a board, which identifies it in the experiment store"""
+    return catalogue.board_hash(GRAPH_FAMILIES[family](size, board_seed))
+
+def store_key(config, seed, master_seed, max_turns):
+    """Return the (graph_id, team_size, agent_config) a game is saved under in the experiment store"""
+    settings = agent_config(agents="heuristic", placement=config.placement, max_turns=max_turns, master_seed=master_seed)
+    return graph_id(config.family, config.size, graph_seed(config, seed)), config.team_size, settings
+
+def run_tournament(configs, seeds, master_seed=0, max_turns=500, workers=None, catalogue_dir=None, store=None):
+    """Play every configuration with every seed across a pool of processes, returning (config, seed, result) tuples.
+    With an experiment store, games already in it aren't played again, and new results are saved as they finish."""
+    tasks = [(config, seed, master_seed, max_turns, catalogue_dir) for config in configs for seed in seeds]
+    workers = workers or os.cpu_count()
+    results = []
+    if store is not None:
+        # Look up each key once, rather than once per seed
+        stored = {}
+        for config, seed, *rest in tasks:
+            key = store_key(config, seed, master_seed, max_turns)
+            if key not in stored:
+                stored[key] = store.results(*key)
+        remaining = []
+        for task in tasks:
+            config, seed = task[:2]
+            result = stored[store_key(config, seed, master_seed, max_turns)].get(seed)
+            if result is None:
+                remaining.append(task)
+            else:
+                results.append((config, seed, result))
+        tasks = remaining
+    if not tasks:
+        return results
+    if catalogue_dir is not None:
+        # Add every board to the catalogue up front, so the workers don't all compute the same missing board
+        for family, size, board_seed in sorted({(config.family, config.size, graph_seed(config, seed)) for config, seed, *rest in tasks}):
+            catalogue.store(GRAPH_FAMILIES[family](size, board_seed), workers=workers, directory=catalogue_dir)
+    # Send the games in chunks so the workers aren't waiting on the pool for every short game
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for config, seed, result, seconds in executor.map(play_game, tasks, chunksize=chunksize):
+            if store is not None:
+                store.record(*store_key(config, seed, master_seed, max_turns), seed, config.family, config.size,
+                             config.placement, result, seconds)
+            results.append((config, seed, result))
+    if store is not None:
+        store.flush()
+    return results
+
+def wilson_interval(successes, trials, z=1.96):
+    """Return the 95% Wilson score interval for a proportion"""
+    if trials == 0:
+        return 0.0, 0.0
+    proportion = successes / trials
+    denominator = 1 + z**2 / trials
+    centre = (proportion + z**2 / (2 * trials)) / denominator
+    margin = z * math.sqrt(proportion * (1 - proportion) / trials + z**2 / (4 * trials**2)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+def mean_interval(values, z=1.96):
+    """Return the mean and the half width of its 95% confidence interval"""
+    if not values:
+        return 0.0, 0.0
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, 0.0
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+    return mean, z * math.sqrt(variance / len(values))
+
+def summarise(results):
+    """Group the results by configuration and calculate the win rates and game lengths"""
+    grouped = defaultdict(list)
+    for config, seed, result in results:
+        grouped[config].append(result)
+
+    summary = []
+    for config, games in sorted(grouped.items()):
+        red_wins = sum(1 for result in games if result.winner == "Red")
+        blue_wins = sum(1 for result in games if result.winner == "Blue")
+        lengths = [result.turns for result in games if result.winner in ("Red", "Blue")]
+        repetition_draws = sum(1 for result in games if result.draw_reason == "repetition")
+        summary.append({
+            "config": config,
+            "games": len(games),
+            "red_win_rate": red_wins / len(games),
+            "red_win_interval": wilson_interval(red_wins, len(games)),
+            "blue_win_rate": blue_wins / len(games),
+            "blue_win_interval": wilson_interval(blue_wins, len(games)),
+            "draws": len(games) - red_wins - blue_wins,
+            "repetition_draws": repetition_draws,
+            "repetitions": sum(result.repetitions for result in games) / len(games),   # Repeated positions per game
+            "length": mean_interval(lengths),
+        })
+    return summary
+
+def print_summary(summary):
+    """Print the win rate and game length tables"""
+    print(f"{'family':<10}{'size':>6}{'team':>6}{'bases':>10}{'games':>7}  {'red win rate':<22}{'blue win rate':<22}{'draws':>7}{'repeated':>10}  {'turns':<16}")
+    for row in summary:
+        config = row["config"]
+        red_low, red_high = row["red_win_interval"]
+        blue_low, blue_high = row["blue_win_interval"]
+        mean_length, length_margin = row["length"]
+        print(f"{config.family:<10}{config.size:>6}{config.team_size:>6}{config.placement:>10}{row['games']:>7}  "
+              f"{row['red_win_rate']:.3f} [{red_low:.3f},{red_high:.3f}]  "
+              f"{row['blue_win_rate']:.3f} [{blue_low:.3f},{blue_high:.3f}]  "
+              f"{row['draws']:>7}{row['repetition_draws']:>10}  {mean_length:7.1f} +/- {length_margin:.1f}")
+
+def main():
+    """Run a tournament from the command line"""
+    parser = argparse.ArgumentParser(description="Play Prototype3 games over a grid of configurations.")
+    parser.add_argument("--families", nargs="+", default=["grid"], choices=sorted(GRAPH_FAMILIES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[4])
+    parser.add_argument("--team-sizes", nargs="+", type=int, default=[1, 2, 3])
+    parser.add_argument("--placements", nargs="+", default=["ends"], choices=["ends", "diameter", "random"])
+    parser.add_argument("--seeds", type=int, default=100, help="number of seeds to play for each configuration")
+    parser.add_argument("--master-seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--catalogue", default=None, help="directory of the board catalogue to load distances from")
+    parser.add_argument("--store", default=None, help="experiment database to save results to and resume from")
+    args = parser.parse_args()
+
+    configs = [Config(*values) for values in itertools.product(args.families, args.sizes, args.team_sizes, args.placements)]
+    store = ExperimentStore(args.store) if args.store is not None else None
+    try:
+        results = run_tournament(configs, range(args.seeds), args.master_seed, args.max_turns, args.workers, args.catalogue,
+                                 store)
+    finally:
+        if store is not None:
+            store.close()
+    print_summary(summarise(results))
+
+if __name__ == "__main__":
+    main()
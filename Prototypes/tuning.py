@@ -0,0 +1,139 @@
+# FILE:         tuning.py
+# AUTHOR:       Adam Robinson
+# DATE:         18/10/2026
+# DESCRIPTION:  Tune the weights the Prototype3 heuristics use to score moves, with self-play across every core.
+#               Candidate weights are found by successive halving: every candidate plays a few games against the
+#               default weights, the worst are dropped, and the survivors play more games, until one is left. This
+#               spends most of the games on the promising candidates and drops hopeless ones early.
+#               Every candidate plays the same seeds, half as red and half as blue, so they are compared on equal terms.
+#               The heuristics are nearly deterministic, so as in self-play each game opens with a few random moves and
+#               then makes a random move now and then, which the seed decides; otherwise every seed plays the same game.
+#               The best weights found are saved to a JSON file for each graph family.
+
+import argparse
+import hashlib
+import importlib
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from atomic import atomic_file
+from tournament import GRAPH_FAMILIES, load_graph
+
+game = importlib.import_module("Prototype3-Teams")
+
+# The range each weight is sampled from
+BOUNDS = game.ScoringWeights(cluster_penalty=(0.0, 1.0), threat_penalty=(0.0, 1.0), carrier_penalty=(0.0, 1.0), proximity=(0.0, 4.0))
+
+TUNED_WEIGHTS = "tuned_weights.json"
+
+def sample_weights(rng):
+    """Pick a random set of weights within the bounds"""
+    return game.ScoringWeights(*(round(rng.uniform(low, high), 3) for low, high in BOUNDS))
+
+def evaluation_seed(master_seed, game_index):
+    """Derive the seed of an evaluation game, which is the same for every candidate"""
+    key = f"{master_seed}:{game_index}"
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+
+def play_match(task):
+    """Play one game between a candidate and the default weights, returning the candidate's points (run in a worker)"""
+    (candidate, game_index, family, size, board_seed, team_size, max_turns, master_seed, catalogue_dir, opening_moves,
+     epsilon) = task
+    graph, distances = load_graph(family, size, board_seed, catalogue_dir)
+    # The candidate plays red in even games and blue in odd games
+    team = "red" if game_index % 2 == 0 else "blue"
+    opponent = "blue" if team == "red" else "red"
+    result = game.run_game(graph, team_size, seed=evaluation_seed(master_seed, game_index // 2), max_turns=max_turns,
+                           distances=distances, weights={team: game.ScoringWeights(*candidate), opponent: game.DEFAULT_WEIGHTS},
+                           opening_moves=opening_moves, epsilon=epsilon)
+    if result.winner == "Draw":
+        return 0.5
+    return 1.0 if result.winner.lower() == team else 0.0
+
+def successive_halving(family="grid", size=4, board_seed=0, team_size=3, candidates=27, eta=3, min_games=8,
+                       max_turns=300, workers=None, seed=0, catalogue_dir=None, verbose=True, opening_moves=4, epsilon=0.05):
+    """Search for the best weights, returning (weights, score, games played) for the winning candidate.
+    Each game starts with opening_moves random moves, and after that makes a random move with probability epsilon."""
+    rng = random.Random(seed)
+    # Always include the current weights, so the tuned weights are never worse than them on the games played
+    population = [game.DEFAULT_WEIGHTS] + [sample_weights(rng) for candidate in range(candidates - 1)]
+    points = {candidate: 0.0 for candidate in population}
+    played = 0
+    target = min_games
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Bring every surviving candidate up to the target number of games
+            tasks = [(tuple(candidate), game_index, family, size, board_seed, team_size, max_turns, seed, catalogue_dir,
+                      opening_moves, epsilon)
+                     for candidate in population for game_index in range(played, target)]
+            chunksize = max(1, len(tasks) // (workers * 8))
+            for task, score in zip(tasks, executor.map(play_match, tasks, chunksize=chunksize)):
+                points[game.ScoringWeights(*task[0])] += score
+            played = target
+
+            # Rank the candidates by the share of points they won
+            population.sort(key=lambda candidate: points[candidate], reverse=True)
+            if verbose:
+                best = population[0]
+                print(f"{len(population):>4} candidates after {played:>5} games each, best {points[best] / played:.3f}: {best}")
+            if len(population) == 1:
+                break
+            # Keep the best 1/eta of the candidates, and give them eta times as many games
+            population = population[:math.ceil(len(population) / eta)]
+            target = played * eta
+
+    best = population[0]
+    return best, points[best] / played, played
+
+def load_weights(family, path=TUNED_WEIGHTS):
+    """Return the tuned weights for a graph family, or the default weights if it hasn't been tuned"""
+    if not os.path.exists(path):
+        return game.DEFAULT_WEIGHTS
+    with open(path) as file:
+        saved = json.load(file)
+    if family not in saved:
+        return game.DEFAULT_WEIGHTS
+    return game.ScoringWeights(**saved[family]["weights"])
+
+def save_weights(family, weights, details, path=TUNED_WEIGHTS):
+    """Save the tuned weights for a graph family, keeping those of the other families"""
+    saved = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            saved = json.load(file)
+    saved[family] = {"weights": weights._asdict(), **details}
+    # Written atomically, so the saved weights are never left half written
+    with atomic_file(path) as file:
+        json.dump(saved, file, indent=2)
+
+def main():
+    """Tune the scoring weights for a graph family"""
+    parser = argparse.ArgumentParser(description="Tune the Prototype3 move scoring weights with parallel self-play.")
+    parser.add_argument("--family", default="grid", choices=sorted(GRAPH_FAMILIES))
+    parser.add_argument("--size", type=int, default=4)
+    parser.add_argument("--board-seed", type=int, default=0, help="seed of the board, for random graphs")
+    parser.add_argument("--team-size", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=27)
+    parser.add_argument("--eta", type=int, default=3, help="fraction of candidates dropped in each round is 1 - 1/eta")
+    parser.add_argument("--min-games", type=int, default=8, help="games each candidate plays in the first round")
+    parser.add_argument("--max-turns", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--catalogue", default=None, help="directory of the board catalogue to load distances from")
+    parser.add_argument("--output", default=TUNED_WEIGHTS)
+    parser.add_argument("--opening-moves", type=int, default=4, help="random moves at the start of each game")
+    parser.add_argument("--epsilon", type=float, default=0.05, help="chance of a random move after the opening")
+    args = parser.parse_args()
+
+    weights, score, played = successive_halving(args.family, args.size, args.board_seed, args.team_size, args.candidates,
+                                                args.eta, args.min_games, args.max_turns, args.workers, args.seed,
+                                                args.catalogue, opening_moves=args.opening_moves, epsilon=args.epsilon)
+    save_weights(args.family, weights, {"score": score, "games": played, "size": args.size, "team_size": args.team_size,
+                                        "opening_moves": args.opening_moves, "epsilon": args.epsilon}, args.output)
+    print(f"Best weights for {args.family}: {weights} (scored {score:.3f} against the defaults over {played} games)")
+
+if __name__ == "__main__":
+    main()